@@ -0,0 +1,95 @@
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+
+    def __init__(self, max_size: int = 512, ttl: float = 24 * 60 * 60, threshold: float = 0.95):
+        """
+        Initializes the SemanticAnswerCache object.
+
+        The cache stores LLM answers by the embedding of the question and a key describing the
+        rest of the prompt (retrieved chunks, prompts, model). A question is answered from the
+        cache if an entry with the same key has a cosine similarity of at least `threshold`.
+
+        Args:
+            max_size (int): The maximum number of entries, the least recently used are evicted.
+            ttl (float): The lifetime of an entry in seconds.
+            threshold (float): The minimum cosine similarity between the questions' embeddings.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        # id записи -> (ключ, нормированный эмбеддинг, ответ, время истечения)
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding):
+        """
+        Returns the embedding scaled to unit length.
+
+        Args:
+            embedding (list): The embedding of the question.
+
+        Returns:
+            np.ndarray: The unit vector.
+        """
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, embedding, key):
+        """
+        Returns the cached answer to the most similar question with the same key.
+
+        Args:
+            embedding (list): The embedding of the question.
+            key (str): The hash of the rest of the prompt.
+
+        Returns:
+            str | None: The cached answer, or None on a miss.
+        """
+        now = time.monotonic()
+        vector = self._normalize(embedding)
+        best_id, best_similarity = None, self.threshold
+        for entry_id, (entry_key, entry_vector, _, expires) in list(self._entries.items()):
+            if expires < now:
+                del self._entries[entry_id]
+                continue
+            if entry_key != key:
+                continue
+            similarity = float(np.dot(vector, entry_vector))
+            if similarity >= best_similarity:
+                best_id, best_similarity = entry_id, similarity
+
+        if best_id is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(best_id)
+        return self._entries[best_id][2]
+
+    def put(self, embedding, key, answer: str):
+        """
+        Stores an answer in the cache.
+
+        Args:
+            embedding (list): The embedding of the question.
+            key (str): The hash of the rest of the prompt.
+            answer (str): The LLM answer.
+        """
+        self._entries[self._next_id] = (key, self._normalize(embedding), answer, time.monotonic() + self.ttl)
+        self._next_id += 1
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes all entries, for example after the knowledge base is replaced.
+        """
+        self._entries.clear()
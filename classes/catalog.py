@@ -0,0 +1,343 @@
+import hashlib
+import math
+import os
+
+import pandas as pd
+
+from classes.keyboards import KeyboardCache
+from classes.catalog_snapshot import read_sheets
+from classes.markdown_v2 import escape_markdown, escape_name
+from config.answers_const_service import (
+    full_answer_text,
+    answer_without_repair_text,
+    answer_without_analysis_text,
+    empty_service_answer,
+    installation_answer_text,
+    installation_none_answer_text,
+    empty_installation_answer,
+)
+
+
+SERVICE_XLSX_PATH = os.path.join('sheet_xlsx', 'service.xlsx')
+INSTALLATION_XLSX_PATH = os.path.join('sheet_xlsx', 'installation.xlsx')
+
+# названия колонок в таблицах service.xlsx и installation.xlsx
+MANUFACTURER_COLUMN = 'Производитель'
+MODEL_COLUMN = 'Модель (category)'
+REPAIR_COST_COLUMN = 'Стоимость услуги 1'
+ANALYSIS_COST_COLUMN = 'Стоимость услуги 2'
+# в installation.xlsx регионы начинаются с третьей колонки
+FIRST_REGION_COLUMN = 2
+# длина версии каталога в callback_data
+VERSION_LENGTH = 6
+# так в таблицах отмечена услуга, которая не оказывается
+NOT_SUPPORTED = '-'
+
+
+class PriceCatalog:
+
+    # виды записей каталога в callback_data
+    MANUFACTURER_KIND = 'f'
+    MODEL_KIND = 'm'
+    REGION_KIND = 'r'
+
+    def __init__(self, service_xlsx: pd.DataFrame, installation_xlsx: pd.DataFrame):
+        """
+        Builds the lookup tables used by the service installation conversation.
+
+        The dataframes are scanned once here, so the handlers only do dict lookups
+        instead of filtering the spreadsheets on every button press. If a model
+        appears in a sheet more than once, the first row wins, as it did with
+        the previous `.values[0]` lookups. The answer texts for every model and
+        every (model, region) pair are built here as well.
+
+        Args:
+            service_xlsx (pd.DataFrame): The dataframe object of the 'service.xlsx' file.
+            installation_xlsx (pd.DataFrame): The dataframe object of the 'installation.xlsx' file.
+        """
+        self.regions = installation_xlsx.columns.tolist()[FIRST_REGION_COLUMN:]
+
+        # производитель -> список моделей, отдельно для каждого типа услуги
+        self.models = {
+            'service': self._group_models(service_xlsx),
+            'installation': self._group_models(installation_xlsx),
+        }
+        self.manufacturers = {service_type: list(models) for service_type, models in self.models.items()}
+
+        # модель -> (стоимость услуги 1, стоимость услуги 2)
+        self.service_costs = {}
+        for model, cost_repair, cost_analysis in zip(service_xlsx[MODEL_COLUMN].tolist(),
+                                                     service_xlsx[REPAIR_COST_COLUMN].tolist(),
+                                                     service_xlsx[ANALYSIS_COST_COLUMN].tolist()):
+            self.service_costs.setdefault(model, (cost_repair, cost_analysis))
+
+        # (модель, регион) -> стоимость установки
+        self.installation_costs = {}
+        self.installation_models = set()
+        region_costs = [installation_xlsx[region].tolist() for region in self.regions]
+        for row, model in enumerate(installation_xlsx[MODEL_COLUMN].tolist()):
+            if model in self.installation_models:
+                continue
+            self.installation_models.add(model)
+            for region, costs in zip(self.regions, region_costs):
+                self.installation_costs[(model, region)] = costs[row]
+
+        # короткие числовые идентификаторы для callback_data
+        self.version = self._content_version(service_xlsx, installation_xlsx)
+        self._names = {
+            self.MANUFACTURER_KIND: list(dict.fromkeys(self.manufacturers['service'] + self.manufacturers['installation'])),
+            self.MODEL_KIND: list(dict.fromkeys(service_xlsx[MODEL_COLUMN].tolist() + installation_xlsx[MODEL_COLUMN].tolist())),
+            self.REGION_KIND: list(self.regions),
+        }
+        self._ids = {kind: {name: index for index, name in enumerate(names)} for kind, names in self._names.items()}
+
+        # готовые ответы в MarkdownV2: ошибки в таблицах обнаруживаются при загрузке, а не в диалоге
+        self.service_answers = {model: self._service_answer(model, *costs) for model, costs in self.service_costs.items()}
+        self.installation_answers = {(model, region): self._installation_answer(model, region, cost)
+                                     for (model, region), cost in self.installation_costs.items()}
+
+        # клавиатуры строятся вместе с каталогом и заменяются вместе с ним
+        self.keyboards = KeyboardCache(self)
+
+    @staticmethod
+    def _content_version(service_xlsx: pd.DataFrame, installation_xlsx: pd.DataFrame):
+        """
+        Returns a short hash of the spreadsheets' contents.
+
+        Args:
+            service_xlsx (pd.DataFrame): The dataframe object of the 'service.xlsx' file.
+            installation_xlsx (pd.DataFrame): The dataframe object of the 'installation.xlsx' file.
+
+        Returns:
+            str: The first VERSION_LENGTH hex digits of the hash.
+        """
+        digest = hashlib.sha1()
+        for data in (service_xlsx, installation_xlsx):
+            digest.update(repr(data.columns.tolist()).encode())
+            digest.update(pd.util.hash_pandas_object(data.astype(str), index=False).values.tobytes())
+        return digest.hexdigest()[:VERSION_LENGTH]
+
+    @staticmethod
+    def _format_cost(cost, where: str):
+        """
+        Formats a cost from a price sheet for an answer.
+
+        Args:
+            cost: The cell value: a number, a numeric string or NOT_SUPPORTED.
+            where (str): The model (and region) of the cell, for the error message.
+
+        Returns:
+            str | None: The MarkdownV2-escaped cost, or None if the service is not supported.
+
+        Raises:
+            ValueError: If the cell is empty or not a number.
+        """
+        if isinstance(cost, str):
+            cost = cost.strip()
+            if cost == NOT_SUPPORTED:
+                return None
+            try:
+                cost = float(cost.replace(',', '.'))
+            except ValueError:
+                raise ValueError(f'Стоимость "{cost}" ({where}) не является числом') from None
+        if isinstance(cost, bool) or not isinstance(cost, (int, float)) or math.isnan(cost) or cost < 0:
+            raise ValueError(f'Неверная стоимость {cost!r} ({where})')
+        if cost == int(cost):
+            cost = int(cost)
+        return escape_markdown(str(cost))
+
+    @staticmethod
+    def _format_name(name, kind: str):
+        """
+        Escapes a model or region name for an answer.
+
+        Args:
+            name: The name from a price sheet.
+            kind (str): What the name is, for the error message.
+
+        Returns:
+            str: The MarkdownV2-escaped name.
+
+        Raises:
+            ValueError: If the name is empty.
+        """
+        if name is None or (isinstance(name, float) and math.isnan(name)) or not str(name).strip():
+            raise ValueError(f'Пустое название: {kind} {name!r}')
+        return escape_name(str(name))
+
+    def _service_answer(self, model, cost_repair, cost_analysis):
+        """
+        Builds the answer with the service costs of a model.
+
+        Returns:
+            str: The MarkdownV2 answer text.
+        """
+        model_text = self._format_name(model, 'модель')
+        cost_repair = self._format_cost(cost_repair, model)
+        cost_analysis = self._format_cost(cost_analysis, model)
+        if cost_repair is not None and cost_analysis is not None:
+            return full_answer_text.format(model_from_user=model_text, cost_repair=cost_repair, cost_analysis=cost_analysis)
+        if cost_analysis is not None:
+            return answer_without_repair_text.format(model_from_user=model_text, cost_analysis=cost_analysis)
+        if cost_repair is not None:
+            return answer_without_analysis_text.format(model_from_user=model_text, cost_repair=cost_repair)
+        return empty_service_answer
+
+    def _installation_answer(self, model, region, cost):
+        """
+        Builds the answer with the installation cost of a model in a region.
+
+        Returns:
+            str: The MarkdownV2 answer text.
+        """
+        model_text = self._format_name(model, 'модель')
+        region_text = self._format_name(region, 'регион')
+        cost = self._format_cost(cost, f'{model}, {region}')
+        if cost is None:
+            return installation_none_answer_text.format(model_from_user=model_text, region_from_user=region_text)
+        return installation_answer_text.format(model_from_user=model_text, region_from_user=region_text,
+                                               cost_installation=cost)
+
+    @staticmethod
+    def _group_models(data: pd.DataFrame):
+        """
+        Groups the models of a sheet by manufacturer, keeping the sheet order.
+
+        Args:
+            data (pd.DataFrame): The dataframe object of a price sheet.
+
+        Returns:
+            dict: Manufacturer name mapped to the list of its models.
+        """
+        grouped = {}
+        for manufacturer, model in zip(data[MANUFACTURER_COLUMN].tolist(), data[MODEL_COLUMN].tolist()):
+            grouped.setdefault(manufacturer, []).append(model)
+        return grouped
+
+    def get_manufacturers(self, service_type: str):
+        """
+        Returns the manufacturers available for the service type.
+
+        Args:
+            service_type (str): Either 'service' or 'installation'.
+
+        Returns:
+            list: Manufacturer names in sheet order.
+        """
+        return self.manufacturers[service_type]
+
+    def get_models(self, service_type: str, manufacturer: str):
+        """
+        Returns the models of a manufacturer available for the service type.
+
+        Args:
+            service_type (str): Either 'service' or 'installation'.
+            manufacturer (str): The manufacturer name.
+
+        Returns:
+            list: Model names in sheet order, empty if the manufacturer is unknown.
+        """
+        return self.models[service_type].get(manufacturer, [])
+
+    def get_service_costs(self, model: str):
+        """
+        Returns the service costs of a model.
+
+        Args:
+            model (str): The model name.
+
+        Returns:
+            tuple | None: (cost_repair, cost_analysis), or None if the model is not in service.xlsx.
+        """
+        return self.service_costs.get(model)
+
+    def get_installation_cost(self, model: str, region: str):
+        """
+        Returns the installation cost of a model in a region.
+
+        Args:
+            model (str): The model name.
+            region (str): The region name.
+
+        Returns:
+            The cost from installation.xlsx, or None if the pair is not in the sheet.
+        """
+        return self.installation_costs.get((model, region))
+
+    def get_service_answer(self, model: str):
+        """
+        Returns the ready answer with the service costs of a model.
+
+        Args:
+            model (str): The model name.
+
+        Returns:
+            str: The MarkdownV2 answer text.
+        """
+        return self.service_answers.get(model, empty_service_answer)
+
+    def get_installation_answer(self, model: str, region: str):
+        """
+        Returns the ready answer with the installation cost of a model in a region.
+
+        Args:
+            model (str): The model name.
+            region (str): The region name.
+
+        Returns:
+            str: The MarkdownV2 answer text.
+        """
+        return self.installation_answers.get((model, region), empty_installation_answer)
+
+    def encode(self, kind: str, name: str):
+        """
+        Returns the compact callback data of a catalog entry.
+
+        Args:
+            kind (str): MANUFACTURER_KIND, MODEL_KIND or REGION_KIND.
+            name (str): The name of the entry.
+
+        Returns:
+            str: Callback data like 'a1b2c3:m12' - the catalog version, the kind and the entry ID.
+        """
+        return f'{self.version}:{kind}{self._ids[kind][name]}'
+
+    def decode(self, data: str, kind: str):
+        """
+        Returns the catalog entry encoded in callback data.
+
+        Args:
+            data (str): The callback data created by encode.
+            kind (str): The expected kind of the entry.
+
+        Returns:
+            str | None: The name of the entry, or None if the button was created for
+            another catalog version or does not encode an entry of this kind.
+        """
+        version, _, entry = data.partition(':')
+        if version != self.version or entry[:1] != kind or not (entry[1:].isascii() and entry[1:].isdigit()):
+            return None
+        names = self._names[kind]
+        index = int(entry[1:])
+        return names[index] if index < len(names) else None
+
+
+def load_catalog(service_path: str = SERVICE_XLSX_PATH, installation_path: str = INSTALLATION_XLSX_PATH):
+    """
+    Reads the price spreadsheets and builds a catalog from them.
+
+    An up-to-date snapshot built by `python -m classes.catalog_snapshot` is used instead of
+    parsing the workbooks when available. This is a blocking, CPU-bound call: when the event
+    loop is running, run it with `run_in_process` (the catalog is picklable).
+
+    Args:
+        service_path (str): The path to the 'service.xlsx' file.
+        installation_path (str): The path to the 'installation.xlsx' file.
+
+    Returns:
+        PriceCatalog: The new catalog.
+
+    Raises:
+        ValueError: If a cost or a name in the spreadsheets is invalid.
+    """
+    return PriceCatalog(*read_sheets(service_path, installation_path))
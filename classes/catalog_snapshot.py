@@ -0,0 +1,120 @@
+import argparse
+import hashlib
+import logging
+import os
+import pickle
+
+import pandas as pd
+
+
+SNAPSHOT_PATH = os.path.join('sheet_xlsx', 'catalog.pkl')
+# увеличивается при изменении структуры снимка
+SNAPSHOT_FORMAT = 1
+
+
+def file_hash(path: str):
+    """
+    Returns the SHA-256 hash of a file's contents.
+
+    Args:
+        path (str): The path to the file.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_snapshot(service_path: str, installation_path: str, snapshot_path: str = SNAPSHOT_PATH):
+    """
+    Parses the price spreadsheets and saves them as a pickled snapshot.
+
+    The snapshot stores the dataframes together with the hashes of the source workbooks,
+    so a loader can check that it was built from the current files.
+
+    Args:
+        service_path (str): The path to the 'service.xlsx' file.
+        installation_path (str): The path to the 'installation.xlsx' file.
+        snapshot_path (str): The path to write the snapshot to.
+    """
+    snapshot = {
+        'format': SNAPSHOT_FORMAT,
+        'sources': [file_hash(service_path), file_hash(installation_path)],
+        'service': pd.read_excel(service_path),
+        'installation': pd.read_excel(installation_path),
+    }
+    # пишем во временный файл и переименовываем, чтобы читатели не увидели недописанный снимок
+    tmp_path = f'{snapshot_path}.tmp'
+    with open(tmp_path, 'wb') as file:
+        pickle.dump(snapshot, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, snapshot_path)
+
+
+def load_snapshot(service_path: str, installation_path: str, snapshot_path: str = SNAPSHOT_PATH):
+    """
+    Loads the dataframes from the snapshot if it is up to date.
+
+    The snapshot is used only if it is newer than both workbooks and was built from
+    workbooks with the same contents.
+
+    Args:
+        service_path (str): The path to the 'service.xlsx' file.
+        installation_path (str): The path to the 'installation.xlsx' file.
+        snapshot_path (str): The path to the snapshot.
+
+    Returns:
+        tuple | None: (service dataframe, installation dataframe), or None if the snapshot
+        is missing, outdated or unreadable.
+    """
+    try:
+        snapshot_mtime = os.stat(snapshot_path).st_mtime_ns
+        if any(os.stat(path).st_mtime_ns > snapshot_mtime for path in (service_path, installation_path)):
+            return None
+        with open(snapshot_path, 'rb') as file:
+            snapshot = pickle.load(file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"Не удалось прочитать снимок прайс-листов {snapshot_path}: {e}")
+        return None
+
+    if snapshot.get('format') != SNAPSHOT_FORMAT:
+        return None
+    if snapshot.get('sources') != [file_hash(service_path), file_hash(installation_path)]:
+        return None
+    return snapshot['service'], snapshot['installation']
+
+
+def read_sheets(service_path: str, installation_path: str, snapshot_path: str = SNAPSHOT_PATH):
+    """
+    Returns the price dataframes, from the snapshot when possible and from Excel otherwise.
+
+    Args:
+        service_path (str): The path to the 'service.xlsx' file.
+        installation_path (str): The path to the 'installation.xlsx' file.
+        snapshot_path (str): The path to the snapshot.
+
+    Returns:
+        tuple: (service dataframe, installation dataframe).
+    """
+    sheets = load_snapshot(service_path, installation_path, snapshot_path)
+    if sheets is None:
+        sheets = pd.read_excel(service_path), pd.read_excel(installation_path)
+    return sheets
+
+
+if __name__ == '__main__':
+    from classes.catalog import SERVICE_XLSX_PATH, INSTALLATION_XLSX_PATH
+
+    parser = argparse.ArgumentParser(description='Собирает бинарный снимок прайс-листов для быстрого запуска бота.')
+    parser.add_argument('--service', default=SERVICE_XLSX_PATH, help='путь к service.xlsx')
+    parser.add_argument('--installation', default=INSTALLATION_XLSX_PATH, help='путь к installation.xlsx')
+    parser.add_argument('--output', default=SNAPSHOT_PATH, help='путь к файлу снимка')
+    args = parser.parse_args()
+
+    build_snapshot(args.service, args.installation, args.output)
+    print(f'Снимок сохранён в {args.output}')
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import os
+
+from classes.catalog import SERVICE_XLSX_PATH, INSTALLATION_XLSX_PATH, load_catalog
+from classes.executors import run_in_process
+
+
+# период проверки прайс-листов по умолчанию, в секундах
+DEFAULT_POLL_INTERVAL = 30
+
+
+class CatalogWatcher:
+
+    def __init__(self, service_bot, service_path: str = SERVICE_XLSX_PATH,
+                 installation_path: str = INSTALLATION_XLSX_PATH, interval: float = None):
+        """
+        Initializes the CatalogWatcher object.
+
+        The watcher polls the modification times of the price spreadsheets and, when they change,
+        rebuilds the catalog in the process pool (see run_in_process) and swaps it into the service bot. Conversations
+        in progress keep their user_data; buttons of the old catalog are detected as stale.
+
+        Args:
+            service_bot (ServiceInstallation): The bot whose catalog is replaced.
+            service_path (str): The path to the 'service.xlsx' file.
+            installation_path (str): The path to the 'installation.xlsx' file.
+            interval (float): The polling period in seconds, CATALOG_POLL_INTERVAL from the
+                environment by default.
+        """
+        self.service_bot = service_bot
+        self.paths = (service_path, installation_path)
+        if interval is None:
+            interval = float(os.environ.get('CATALOG_POLL_INTERVAL', DEFAULT_POLL_INTERVAL))
+        self.interval = interval
+        self._seen_mtimes = self._mtimes()
+        self._task = None
+
+    def _mtimes(self):
+        """
+        Returns the modification times of the watched spreadsheets.
+
+        Returns:
+            tuple: The st_mtime_ns of each file, None for a missing file.
+        """
+        mtimes = []
+        for path in self.paths:
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except FileNotFoundError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    async def check(self):
+        """
+        Reloads the catalog if the spreadsheets have changed since the last check.
+
+        A workbook that fails to parse (for example, while it is still being written) is
+        logged and retried on the next check; the current catalog stays in use.
+
+        Returns:
+            bool: True if a new catalog was swapped in.
+        """
+        mtimes = self._mtimes()
+        if mtimes == self._seen_mtimes or None in mtimes:
+            return False
+        catalog = await run_in_process('load_catalog', load_catalog, *self.paths)
+        self._seen_mtimes = mtimes
+        current = self.service_bot.catalog
+        if current is not None and catalog.version == current.version:
+            return False
+        self.service_bot.catalog = catalog
+        logging.info(f"Прайс-листы перезагружены, версия каталога {catalog.version}")
+        return True
+
+    async def run(self):
+        """
+        Checks the spreadsheets every `interval` seconds until cancelled.
+        """
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logging.error(f"Ошибка перезагрузки прайс-листов: {e}")
+
+    def start(self):
+        """
+        Starts polling in a background task of the running event loop.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """
+        Stops the background polling task.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
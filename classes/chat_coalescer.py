@@ -0,0 +1,78 @@
+import asyncio
+
+
+class _ChatState:
+
+    def __init__(self):
+        # вопросы, на которые ещё не начат (или был прерван) ответ
+        self.pending = []
+        # номер последнего сообщения чата
+        self.generation = 0
+        self.lock = asyncio.Lock()
+        self.task = None
+        # задача, прерванная новым сообщением
+        self.superseded = None
+
+
+class ChatCoalescer:
+
+    def __init__(self, window: float = 0.5):
+        """
+        Initializes the ChatCoalescer object.
+
+        Answers the messages of one chat one at a time. Messages that arrive within `window`
+        seconds of each other are merged into one question, and a new message cancels the answer
+        that is still being generated: its question is merged into the new one.
+
+        Args:
+            window (float): How long to wait for the next message of a burst, in seconds.
+        """
+        self.window = window
+        self._chats = {}
+
+    async def run(self, chat_id: int, text: str, answer, deliver):
+        """
+        Queues the message and answers it, unless a later message of the chat takes it over.
+
+        Args:
+            chat_id (int): The chat of the message.
+            text (str): The text of the message.
+            answer (callable): The coroutine function that is awaited with the merged question;
+                it is cancelled if a new message arrives before it returns.
+            deliver (callable): The coroutine function that is awaited with the result of `answer`
+                to send it; it is not cancelled by new messages.
+
+        Returns:
+            The result of `deliver`, or None if the message was merged into a later one.
+        """
+        state = self._chats.setdefault(chat_id, _ChatState())
+        state.pending.append(text)
+        state.generation += 1
+        generation = state.generation
+        if state.task is not None and not state.task.done():
+            state.superseded = state.task
+            state.task.cancel()
+
+        await asyncio.sleep(self.window)
+        if state.generation != generation:
+            return None
+        async with state.lock:
+            if state.generation != generation:
+                return None
+            texts, state.pending = state.pending, []
+            task = state.task = asyncio.create_task(answer('\n'.join(texts)))
+            try:
+                try:
+                    result = await task
+                except asyncio.CancelledError:
+                    if state.superseded is not task:
+                        raise
+                    # прерванный вопрос отвечается вместе со следующим сообщением
+                    state.pending[:0] = texts
+                    return None
+                finally:
+                    state.task = None
+                return await deliver(result)
+            finally:
+                if state.generation == generation and not state.pending:
+                    self._chats.pop(chat_id, None)
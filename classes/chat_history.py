@@ -0,0 +1,35 @@
+from collections import deque
+
+
+# сколько последних пар вопрос-ответ попадает в промпт нейро-консультанта
+HISTORY_LENGTH = 4
+
+
+def new_chat_history():
+    """
+    Returns an empty chat history that keeps only the last HISTORY_LENGTH entries.
+
+    Returns:
+        deque: The bounded history.
+    """
+    return deque(maxlen=HISTORY_LENGTH)
+
+
+def get_chat_history(user_data: dict):
+    """
+    Returns the user's chat history, creating or converting it if needed.
+
+    Histories saved before the history became bounded (plain lists) are cut
+    to the last HISTORY_LENGTH entries.
+
+    Args:
+        user_data (dict): The user data of the Telegram context.
+
+    Returns:
+        deque: The bounded history stored in user_data['chat_history'].
+    """
+    history = user_data.get('chat_history')
+    if not isinstance(history, deque) or history.maxlen != HISTORY_LENGTH:
+        history = deque(history or [], maxlen=HISTORY_LENGTH)
+        user_data['chat_history'] = history
+    return history
@@ -0,0 +1,251 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from classes.executors import run_in_thread
+
+
+def normalize_query(text: str):
+    """
+    Normalizes a user's question for use as a cache key: collapses whitespace and ignores case.
+
+    Documents are not normalized: chunks that differ only in case or layout keep their own vectors.
+
+    Args:
+        text (str): The question to embed.
+
+    Returns:
+        str: The normalized text.
+    """
+    return ' '.join(text.split()).casefold()
+
+
+class CachedEmbeddings(Embeddings):
+
+    def __init__(self, embeddings: Embeddings, max_size: int = 4096, persist_path: str = None):
+        """
+        Initializes the CachedEmbeddings object.
+
+        Wraps an embeddings client with an in-memory LRU cache and, optionally, an SQLite file
+        that keeps the vectors between restarts. Keys are the model name and the text; questions
+        are normalized first (see normalize_query), so repeated and trivially different questions
+        are embedded only once.
+
+        Args:
+            embeddings (Embeddings): The wrapped embeddings client.
+            max_size (int): The maximum number of vectors kept in memory.
+            persist_path (str): The path to the SQLite cache file, None to keep the cache in memory only.
+        """
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, 'model', type(embeddings).__name__)
+        self.max_size = max_size
+        self._memory = OrderedDict()
+        self._connection = None
+        # соединение с файлом кеша используется из потоков пула по очереди
+        self._lock = threading.Lock()
+        if persist_path:
+            self._connection = sqlite3.connect(persist_path, check_same_thread=False)
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS embeddings (model TEXT, text TEXT, vector BLOB, PRIMARY KEY (model, text))')
+            self._connection.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, vector):
+        """
+        Puts a vector into the in-memory LRU cache.
+
+        Args:
+            key (str): The cache key of the text.
+            vector (list): The embedding.
+        """
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, texts, query: bool = False):
+        """
+        Finds the vectors of the texts in the in-memory cache.
+
+        Args:
+            texts (list): The texts to embed.
+            query (bool): Whether the texts are questions, whose keys are normalized.
+
+        Returns:
+            tuple: (list of vectors with None for misses, list of keys).
+        """
+        keys = [normalize_query(text) for text in texts] if query else list(texts)
+        vectors = []
+        for key in keys:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+            vectors.append(vector)
+        return vectors, keys
+
+    def _read_disk(self, keys):
+        """
+        Reads vectors from the SQLite cache. Blocking, run it in a thread from async code.
+
+        Args:
+            keys (list): The cache keys of the texts.
+
+        Returns:
+            dict: The found vectors by cache key.
+        """
+        found = {}
+        with self._lock:
+            for key in keys:
+                row = self._connection.execute(
+                    'SELECT vector FROM embeddings WHERE model = ? AND text = ?', (self.model, key)).fetchone()
+                if row is not None:
+                    found[key] = np.frombuffer(row[0], dtype=np.float32).tolist()
+        return found
+
+    def _write_disk(self, keys, vectors):
+        """
+        Saves vectors to the SQLite cache. Blocking, run it in a thread from async code.
+
+        Args:
+            keys (list): The cache keys of the texts.
+            vectors (list): Their embeddings.
+        """
+        with self._lock:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO embeddings (model, text, vector) VALUES (?, ?, ?)',
+                [(self.model, key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in zip(keys, vectors)])
+            self._connection.commit()
+
+    def _disk_misses(self, vectors, keys):
+        """
+        Returns the keys that are missing from memory and have to be looked up on disk.
+
+        Args:
+            vectors (list): The vectors from memory with None for misses.
+            keys (list): The cache keys of the texts.
+
+        Returns:
+            list: The keys to read from disk, empty without a cache file.
+        """
+        if self._connection is None:
+            return []
+        return list(dict.fromkeys(key for vector, key in zip(vectors, keys) if vector is None))
+
+    def _merge(self, vectors, keys, found):
+        """
+        Fills the misses with the vectors read from disk and counts hits and misses.
+
+        Args:
+            vectors (list): The vectors from memory with None for misses.
+            keys (list): The cache keys of the texts.
+            found (dict): The vectors read from disk by cache key.
+
+        Returns:
+            list: The vectors with None for the remaining misses.
+        """
+        for key, vector in found.items():
+            self._remember(key, vector)
+        vectors = [vector if vector is not None else found.get(key) for vector, key in zip(vectors, keys)]
+        hits = sum(vector is not None for vector in vectors)
+        self.hits += hits
+        self.misses += len(vectors) - hits
+        return vectors
+
+    def _missing(self, texts, vectors, keys):
+        """
+        Returns the texts that have to be sent to the embeddings client, one per key.
+
+        Args:
+            texts (list): The texts to embed.
+            vectors (list): The cached vectors with None for misses.
+            keys (list): The cache keys of the texts.
+
+        Returns:
+            tuple: (list of texts, list of their keys).
+        """
+        missing = {}
+        for text, vector, key in zip(texts, vectors, keys):
+            if vector is None and key not in missing:
+                missing[key] = text
+        return list(missing.values()), list(missing)
+
+    @staticmethod
+    def _fill(vectors, keys, new_vectors):
+        """
+        Replaces the misses with the freshly computed vectors.
+
+        Args:
+            vectors (list): The cached vectors with None for misses.
+            keys (list): The cache keys of the texts.
+            new_vectors (dict): The computed vectors by cache key.
+
+        Returns:
+            list: The vectors of all texts.
+        """
+        return [vector if vector is not None else new_vectors[key] for vector, key in zip(vectors, keys)]
+
+    def _store(self, keys, vectors):
+        """
+        Puts new vectors into the in-memory cache.
+
+        Args:
+            keys (list): The cache keys of the texts.
+            vectors (list): Their embeddings.
+        """
+        for key, vector in zip(keys, vectors):
+            self._remember(key, vector)
+
+    def embed_documents(self, texts):
+        vectors, keys = self._lookup(texts)
+        disk_keys = self._disk_misses(vectors, keys)
+        vectors = self._merge(vectors, keys, self._read_disk(disk_keys) if disk_keys else {})
+        missing_texts, missing_keys = self._missing(texts, vectors, keys)
+        if missing_texts:
+            new_vectors = self.embeddings.embed_documents(missing_texts)
+            self._store(missing_keys, new_vectors)
+            if self._connection is not None:
+                self._write_disk(missing_keys, new_vectors)
+            vectors = self._fill(vectors, keys, dict(zip(missing_keys, new_vectors)))
+        return vectors
+
+    def embed_query(self, text):
+        vectors, keys = self._lookup([text], query=True)
+        disk_keys = self._disk_misses(vectors, keys)
+        vectors = self._merge(vectors, keys, self._read_disk(disk_keys) if disk_keys else {})
+        if vectors[0] is None:
+            vectors = [self.embeddings.embed_query(text)]
+            self._store(keys, vectors)
+            if self._connection is not None:
+                self._write_disk(keys, vectors)
+        return vectors[0]
+
+    async def aembed_documents(self, texts):
+        # запросы к файлу кеша идут в пуле потоков, чтобы не задерживать другие чаты
+        vectors, keys = self._lookup(texts)
+        disk_keys = self._disk_misses(vectors, keys)
+        found = await run_in_thread('embeddings_cache_read', self._read_disk, disk_keys) if disk_keys else {}
+        vectors = self._merge(vectors, keys, found)
+        missing_texts, missing_keys = self._missing(texts, vectors, keys)
+        if missing_texts:
+            new_vectors = await self.embeddings.aembed_documents(missing_texts)
+            self._store(missing_keys, new_vectors)
+            if self._connection is not None:
+                await run_in_thread('embeddings_cache_write', self._write_disk, missing_keys, new_vectors)
+            vectors = self._fill(vectors, keys, dict(zip(missing_keys, new_vectors)))
+        return vectors
+
+    async def aembed_query(self, text):
+        vectors, keys = self._lookup([text], query=True)
+        disk_keys = self._disk_misses(vectors, keys)
+        found = await run_in_thread('embeddings_cache_read', self._read_disk, disk_keys) if disk_keys else {}
+        vectors = self._merge(vectors, keys, found)
+        if vectors[0] is None:
+            vectors = [await self.embeddings.aembed_query(text)]
+            self._store(keys, vectors)
+            if self._connection is not None:
+                await run_in_thread('embeddings_cache_write', self._write_disk, keys, vectors)
+        return vectors[0]
@@ -0,0 +1,141 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+# потоки для работы, отпускающей GIL (FAISS, numpy, чтение файлов)
+THREAD_WORKERS = int(os.environ.get('EXECUTOR_THREADS', min(32, (os.cpu_count() or 1) + 4)))
+# процессы для разбора прайс-листов; 0 - разбор идёт в потоках
+PROCESS_WORKERS = int(os.environ.get('EXECUTOR_PROCESSES', 1))
+# задачи дольше стольких секунд попадают в лог
+SLOW_TASK_SECONDS = float(os.environ.get('SLOW_TASK_SECONDS', 0.5))
+
+_thread_pool = None
+_process_pool = None
+# имя задачи -> [число запусков, суммарное время, максимальное время]
+_timings = defaultdict(lambda: [0, 0.0, 0.0])
+
+
+def _get_thread_pool():
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=THREAD_WORKERS, thread_name_prefix='bot-worker')
+    return _thread_pool
+
+
+def _get_process_pool():
+    global _process_pool
+    if _process_pool is None and PROCESS_WORKERS > 0:
+        # spawn: дочерний процесс не наследует потоки и состояние цикла событий
+        _process_pool = ProcessPoolExecutor(max_workers=PROCESS_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _process_pool
+
+
+def _discard_process_pool(pool):
+    """
+    Forgets a broken process pool, so the next task starts a new one.
+
+    Args:
+        pool (ProcessPoolExecutor): The pool that failed.
+    """
+    global _process_pool
+    if _process_pool is pool:
+        _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _record(name: str, elapsed: float):
+    """
+    Adds the run time of a task to the timings and logs slow tasks.
+
+    Args:
+        name (str): The task name.
+        elapsed (float): The run time in seconds, including the wait for a free worker.
+    """
+    timing = _timings[name]
+    timing[0] += 1
+    timing[1] += elapsed
+    timing[2] = max(timing[2], elapsed)
+    if elapsed >= SLOW_TASK_SECONDS:
+        logging.warning(f"Медленная задача {name}: {elapsed:.3f} с")
+
+
+async def _run(pool, name: str, func, args, kwargs):
+    start = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, functools.partial(func, *args, **kwargs))
+    finally:
+        _record(name or getattr(func, '__qualname__', repr(func)), time.perf_counter() - start)
+
+
+async def run_in_thread(name: str, func, *args, **kwargs):
+    """
+    Runs a blocking function in the shared thread pool, so the event loop keeps dispatching updates.
+
+    Args:
+        name (str): The task name in the timings.
+        func (callable): The function.
+        *args: The positional arguments of the function.
+        **kwargs: The keyword arguments of the function.
+
+    Returns:
+        The result of the function.
+    """
+    return await _run(_get_thread_pool(), name, func, args, kwargs)
+
+
+async def run_in_process(name: str, func, *args, **kwargs):
+    """
+    Runs a CPU-bound function in the process pool, or in the thread pool if it is disabled.
+
+    The function, its arguments and its result must be picklable. If a worker process dies
+    (e.g. killed for memory), the broken pool is replaced and the task is run once more.
+
+    Args:
+        name (str): The task name in the timings.
+        func (callable): A module-level function.
+        *args: The positional arguments of the function.
+        **kwargs: The keyword arguments of the function.
+
+    Returns:
+        The result of the function.
+    """
+    pool = _get_process_pool()
+    if pool is None:
+        return await _run(_get_thread_pool(), name, func, args, kwargs)
+    try:
+        return await _run(pool, name, func, args, kwargs)
+    except BrokenProcessPool as e:
+        logging.error(f"Пул процессов сломан, создаётся новый: {e}")
+        _discard_process_pool(pool)
+    return await _run(_get_process_pool(), name, func, args, kwargs)
+
+
+def task_timings():
+    """
+    Returns the run time statistics of the tasks.
+
+    Returns:
+        dict: Task name mapped to a dict with the number of runs and the mean and maximum time in seconds.
+    """
+    return {name: {'count': count, 'mean': total / count, 'max': longest}
+            for name, (count, total, longest) in _timings.items()}
+
+
+def shutdown():
+    """
+    Stops the pools without waiting for running tasks; queued tasks are cancelled.
+    """
+    global _thread_pool, _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
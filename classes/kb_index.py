@@ -0,0 +1,292 @@
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import pickle
+import time
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+
+# манифест базы знаний: версия и SHA-256 файлов индекса, пишется последним при обновлении
+MANIFEST_NAME = 'manifest.json'
+# файлы точного индекса, которые должны быть из одной сборки
+INDEX_FILES = ('index.pkl', 'index.faiss')
+# сколько раз перечитать файлы, если они попали на середину обновления, и пауза между попытками в секундах
+LOAD_ATTEMPTS = 5
+LOAD_RETRY_DELAY = 2.0
+# виды сжатых индексов: 8-битное скалярное квантование и IVF с продуктовым квантованием
+QUANTIZED_KINDS = ('sq8', 'ivfpq')
+# число проверяемых кластеров IVF при поиске
+DEFAULT_NPROBE = 8
+# сжатый индекс с меньшей полнотой не сохраняется: он терял бы нужные фрагменты
+MIN_RECALL = 0.9
+# MMAP_IFC отображает в память и коды векторов (IndexScalarQuantizer), и инвертированные списки IVF;
+# с IO_FLAG_MMAP коды sq8 читались бы в память процесса целиком
+MMAP_FLAGS = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+
+
+def quantized_index_path(db_path: str, kind: str):
+    """
+    Returns the path of a quantized index next to the exact one.
+
+    Args:
+        db_path (str): The directory of the FAISS index.
+        kind (str): One of QUANTIZED_KINDS.
+
+    Returns:
+        str: The path like 'db/index_sq8.faiss'.
+    """
+    return os.path.join(db_path, f'index_{kind}.faiss')
+
+
+def build_quantized_index(vectors: np.ndarray, kind: str):
+    """
+    Trains a quantized index on the vectors and adds them to it.
+
+    For IVF-PQ the number of clusters and code bits are reduced for small corpora, since
+    training needs more vectors than centroids.
+
+    Args:
+        vectors (np.ndarray): The float32 vectors of the exact index, in index order.
+        kind (str): One of QUANTIZED_KINDS.
+
+    Returns:
+        faiss.Index: The trained index with all vectors added.
+    """
+    count, dimension = vectors.shape
+    if kind == 'sq8':
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    elif kind == 'ivfpq':
+        nlist = max(1, min(int(math.sqrt(count)), count // 39))
+        # 96 подвекторов по 32 измерения для text-embedding-3-large
+        subvectors = next(m for m in (96, 64, 48, 32, 16, 8, 4, 2, 1) if dimension % m == 0)
+        # каждому центроиду квантователя нужно не меньше 39 обучающих векторов
+        nbits = max(1, min(8, int(math.log2(max(count // 39, 2)))))
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dimension), dimension, nlist, subvectors, nbits)
+    else:
+        raise ValueError(f'Неизвестный вид индекса: {kind}')
+    index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def read_quantized_index(path: str):
+    """
+    Memory-maps a quantized index read-only, so that processes on the same machine share its pages.
+
+    Args:
+        path (str): The path of the index file.
+
+    Returns:
+        faiss.Index: The index backed by the file.
+    """
+    return faiss.read_index(path, MMAP_FLAGS)
+
+
+def set_nprobe(index, nprobe: int):
+    """
+    Sets the number of probed clusters if the index is an IVF index.
+
+    Args:
+        index (faiss.Index): The index.
+        nprobe (int): The number of clusters to probe.
+    """
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except RuntimeError:
+        pass
+
+
+def evaluate_recall(exact, quantized, queries: np.ndarray, k: int = 5):
+    """
+    Compares the quantized index with the exact one.
+
+    Args:
+        exact (faiss.Index): The exact index.
+        quantized (faiss.Index): The quantized index.
+        queries (np.ndarray): The float32 query vectors.
+        k (int): The number of neighbours, as num_chunks in the bot.
+
+    Returns:
+        dict: recall@k of the quantized index and the mean search time per query of both, in ms.
+    """
+    start = time.perf_counter()
+    _, exact_ids = exact.search(queries, k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    start = time.perf_counter()
+    _, quantized_ids = quantized.search(queries, k)
+    quantized_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    found = sum(len(set(expected) & set(actual)) for expected, actual in zip(exact_ids, quantized_ids))
+    return {
+        'recall': found / exact_ids.size,
+        'exact_ms': exact_ms,
+        'quantized_ms': quantized_ms,
+    }
+
+
+def write_quantized_index(db_path: str, kind: str, sample_size: int = 200, k: int = 5,
+                          min_recall: float = MIN_RECALL):
+    """
+    Builds a quantized copy of the exact index and checks its recall.
+
+    The queries for the check are stored vectors with a small random perturbation. A copy
+    with recall below `min_recall` is not saved, and a previous copy of that kind is removed,
+    so the bot cannot serve it.
+
+    Args:
+        db_path (str): The directory of the FAISS index.
+        kind (str): One of QUANTIZED_KINDS.
+        sample_size (int): The number of queries for the recall check.
+        k (int): The number of neighbours for the recall check.
+        min_recall (float): The minimum recall@k of a copy that may be used.
+
+    Returns:
+        dict: The result of evaluate_recall and the sizes of both index files in bytes.
+
+    Raises:
+        ValueError: If the recall of the copy is below `min_recall`.
+    """
+    exact_path = os.path.join(db_path, 'index.faiss')
+    exact = faiss.read_index(exact_path)
+    vectors = exact.reconstruct_n(0, exact.ntotal)
+    quantized = build_quantized_index(vectors, kind)
+    set_nprobe(quantized, DEFAULT_NPROBE)
+
+    rng = np.random.default_rng(0)
+    sample = vectors[rng.choice(len(vectors), size=min(sample_size, len(vectors)), replace=False)]
+    queries = (sample + rng.normal(scale=0.01, size=sample.shape)).astype(np.float32)
+    report = evaluate_recall(exact, quantized, queries, k)
+
+    path = quantized_index_path(db_path, kind)
+    if report['recall'] < min_recall:
+        if os.path.exists(path):
+            os.remove(path)
+        raise ValueError(f"Полнота сжатого индекса {kind} recall@{k} = {report['recall']:.3f} ниже {min_recall}")
+    faiss.write_index(quantized, f'{path}.tmp')
+    os.replace(f'{path}.tmp', path)
+    report['exact_bytes'] = os.path.getsize(exact_path)
+    report['quantized_bytes'] = os.path.getsize(path)
+    return report
+
+
+def file_hashes(db_path: str):
+    """
+    Returns the SHA-256 hex digests of the exact index files, for the manifest.
+
+    Args:
+        db_path (str): The directory of the FAISS index.
+
+    Returns:
+        dict: File name mapped to its digest.
+    """
+    hashes = {}
+    for name in INDEX_FILES:
+        digest = hashlib.sha256()
+        with open(os.path.join(db_path, name), 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        hashes[name] = digest.hexdigest()
+    return hashes
+
+
+def _read_index_files(db_path: str, names):
+    """
+    Reads index files and checks that they belong to the build described by the manifest.
+
+    The ingestion tool replaces the files one by one and writes the manifest last, so a reader
+    can meet a mix of two builds. The files are read once and checked against the manifest
+    hashes; the caller deserializes exactly the checked bytes. Without a manifest, or with one
+    written before the hashes were recorded, the files are not checked.
+
+    Args:
+        db_path (str): The directory of the FAISS index.
+        names (tuple): The names of the files to read, from INDEX_FILES.
+
+    Returns:
+        dict: File name mapped to its contents.
+
+    Raises:
+        ValueError: If the files still do not match the manifest after LOAD_ATTEMPTS reads.
+    """
+    for attempt in range(LOAD_ATTEMPTS):
+        try:
+            with open(os.path.join(db_path, MANIFEST_NAME), encoding='utf-8') as file:
+                expected = json.load(file).get('files', {})
+        except FileNotFoundError:
+            expected = {}
+        contents = {}
+        for name in names:
+            with open(os.path.join(db_path, name), 'rb') as file:
+                contents[name] = file.read()
+        mismatched = [name for name in names
+                      if name in expected and hashlib.sha256(contents[name]).hexdigest() != expected[name]]
+        if not mismatched:
+            return contents
+        if attempt < LOAD_ATTEMPTS - 1:
+            logging.info(f"Файлы {mismatched} не совпадают с манифестом: идёт обновление базы знаний, повтор")
+            time.sleep(LOAD_RETRY_DELAY)
+    raise ValueError(f'Файлы {mismatched} не совпадают с манифестом базы знаний')
+
+
+def load_knowledge_base(db_path: str, embeddings, index_kind: str = None, nprobe: int = DEFAULT_NPROBE):
+    """
+    Loads the knowledge base vectorstore.
+
+    The docstore and the exact index are checked against the manifest hashes, so a load that
+    overlaps an update never pairs the documents of one build with the vectors of another.
+    With `index_kind` set, the quantized index is memory-mapped read-only instead of reading
+    the exact index into memory, so several bot processes share its pages. The quantized index
+    is used only if it is not older than the exact one and has the same number of vectors;
+    otherwise the exact index is loaded.
+
+    Args:
+        db_path (str): The directory of the FAISS index.
+        embeddings (Embeddings): The embeddings client of the index.
+        index_kind (str): One of QUANTIZED_KINDS, or None for the exact index.
+        nprobe (int): The number of clusters probed by an IVF index.
+
+    Returns:
+        FAISS: The vectorstore.
+
+    Raises:
+        ValueError: If the index files do not match the manifest, see _read_index_files.
+    """
+    if index_kind:
+        path = quantized_index_path(db_path, index_kind)
+        docstore, index_to_docstore_id = pickle.loads(_read_index_files(db_path, ('index.pkl',))['index.pkl'])
+        try:
+            if os.stat(path).st_mtime_ns < os.stat(os.path.join(db_path, 'index.faiss')).st_mtime_ns:
+                raise ValueError('индекс старше точного')
+            index = read_quantized_index(path)
+            if index.ntotal != len(index_to_docstore_id):
+                raise ValueError('число векторов не совпадает с точным индексом')
+            set_nprobe(index, nprobe)
+            return FAISS(embeddings, index, docstore, index_to_docstore_id)
+        except (OSError, RuntimeError, ValueError) as e:
+            logging.warning(f"Сжатый индекс {path} не используется, загружается точный: {e}")
+    contents = _read_index_files(db_path, INDEX_FILES)
+    docstore, index_to_docstore_id = pickle.loads(contents['index.pkl'])
+    index = faiss.deserialize_index(np.frombuffer(contents['index.faiss'], dtype=np.uint8))
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Строит сжатую копию индекса базы знаний и проверяет её полноту.')
+    parser.add_argument('kind', choices=QUANTIZED_KINDS, help='вид сжатого индекса')
+    parser.add_argument('--db', default=os.path.join('db'), help='папка индекса FAISS')
+    parser.add_argument('-k', type=int, default=5, help='число соседей для проверки полноты')
+    parser.add_argument('--min-recall', type=float, default=MIN_RECALL, help='минимальная полнота сжатого индекса')
+    args = parser.parse_args()
+
+    try:
+        result = write_quantized_index(args.db, args.kind, k=args.k, min_recall=args.min_recall)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f"recall@{args.k}: {result['recall']:.3f}")
+    print(f"поиск: точный {result['exact_ms']:.3f} мс, сжатый {result['quantized_ms']:.3f} мс на запрос")
+    print(f"размер: точный {result['exact_bytes']} байт, сжатый {result['quantized_bytes']} байт")
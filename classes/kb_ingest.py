@@ -0,0 +1,225 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_text_splitters import Language, RecursiveCharacterTextSplitter
+
+from classes.executors import run_in_thread
+from classes.kb_index import (
+    INDEX_FILES,
+    MANIFEST_NAME,
+    QUANTIZED_KINDS,
+    file_hashes,
+    load_knowledge_base,
+    quantized_index_path,
+    write_quantized_index,
+)
+from classes.limiter import retry_with_jitter
+
+
+# файлы базы знаний, которые читает ingest
+SOURCE_EXTENSIONS = ('.md', '.txt')
+# клиент эмбеддингов сам не повторяет запросы: пакет повторяется после ошибок провайдера
+# до EMBED_ATTEMPTS раз, чтобы сбой одного пакета не отменял уже посчитанные
+EMBED_ATTEMPTS = 5
+EMBED_RETRY_DELAY = 2.0
+
+
+def chunk_hash(text: str):
+    """
+    Returns the content hash of a chunk.
+
+    Args:
+        text (str): The chunk text.
+
+    Returns:
+        str: The SHA-256 hex digest.
+    """
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def read_sources(paths):
+    """
+    Reads the knowledge base documents.
+
+    Args:
+        paths (list): Files or directories; directories are searched recursively
+            for files with SOURCE_EXTENSIONS.
+
+    Returns:
+        dict: Source path mapped to the document text.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, name) for name in sorted(names) if name.endswith(SOURCE_EXTENSIONS)]
+        else:
+            files.append(path)
+    sources = {}
+    for file in files:
+        with open(file, encoding='utf-8') as source:
+            sources[file] = source.read()
+    return sources
+
+
+def split_sources(sources, chunk_size: int):
+    """
+    Splits the documents into chunks along markdown headers and paragraphs.
+
+    Args:
+        sources (dict): Source path mapped to the document text.
+        chunk_size (int): The maximum chunk length in characters.
+
+    Returns:
+        list: Documents with 'source' and 'chunkID' metadata, like the existing index.
+    """
+    splitter = RecursiveCharacterTextSplitter.from_language(Language.MARKDOWN, chunk_size=chunk_size, chunk_overlap=0)
+    documents = []
+    for source, text in sources.items():
+        for chunk_id, chunk in enumerate(splitter.split_text(text)):
+            documents.append(Document(page_content=chunk, metadata={'source': source, 'chunkID': chunk_id}))
+    return documents
+
+
+def existing_vectors(db: FAISS):
+    """
+    Returns the documents of an index with their vectors.
+
+    Args:
+        db (FAISS): The current vectorstore.
+
+    Returns:
+        list: (Document, vector) pairs in index order.
+    """
+    pairs = []
+    for position, docstore_id in sorted(db.index_to_docstore_id.items()):
+        pairs.append((db.docstore.search(docstore_id), db.index.reconstruct(position).tolist()))
+    return pairs
+
+
+async def embed_texts(embeddings, texts, batch_size: int):
+    """
+    Embeds the texts in batches, repeating a batch after provider errors.
+
+    Args:
+        embeddings (Embeddings): The embeddings client.
+        texts (list): The texts to embed.
+        batch_size (int): The number of texts per embeddings request.
+
+    Returns:
+        list: The vectors in the order of the texts.
+    """
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        vectors += await retry_with_jitter(lambda: run_in_thread('embed_documents', embeddings.embed_documents, batch),
+                                           attempts=EMBED_ATTEMPTS, base_delay=EMBED_RETRY_DELAY)
+        logging.info(f"Эмбеддинги: {len(vectors)} из {len(texts)}")
+    return vectors
+
+
+def ingest(paths, db_path: str, embeddings, chunk_size: int = 1500, batch_size: int = 64, prune: bool = False):
+    """
+    Updates the knowledge base index with the given documents.
+
+    The chunks of the given sources replace their previous chunks; chunks of other sources are
+    kept unless `prune` is set. Vectors of chunks whose text is already in the index are reused,
+    only new or changed chunks are sent to the embeddings client, in batches repeated after provider
+    errors. The new index is
+    written next to the old one and moved into place, existing quantized copies are rebuilt,
+    then the manifest is replaced; the bot reloads the index when the manifest changes.
+
+    Args:
+        paths (list): Files or directories with the documents.
+        db_path (str): The directory of the FAISS index.
+        embeddings (Embeddings): The embeddings client, the same model as the index.
+        chunk_size (int): The maximum chunk length in characters.
+        batch_size (int): The number of chunks per embeddings request.
+        prune (bool): Whether to drop the chunks of sources that were not given.
+
+    Returns:
+        dict: The manifest of the new index.
+    """
+    sources = read_sources(paths)
+    documents = split_sources(sources, chunk_size)
+
+    known = {}
+    kept = []
+    if os.path.exists(os.path.join(db_path, 'index.faiss')):
+        db = load_knowledge_base(db_path, embeddings)
+        for document, vector in existing_vectors(db):
+            known.setdefault(chunk_hash(document.page_content), vector)
+            if not prune and document.metadata.get('source') not in sources:
+                kept.append((document, vector))
+
+    missing = [document for document in documents if chunk_hash(document.page_content) not in known]
+    texts = list(dict.fromkeys(document.page_content for document in missing))
+    if texts:
+        for text, vector in zip(texts, asyncio.run(embed_texts(embeddings, texts, batch_size))):
+            known[chunk_hash(text)] = vector
+
+    pairs = kept + [(document, known[chunk_hash(document.page_content)]) for document in documents]
+    if not pairs:
+        raise ValueError('База знаний пуста: нет ни одного фрагмента')
+    new_db = FAISS.from_embeddings(
+        [(document.page_content, vector) for document, vector in pairs],
+        embeddings,
+        metadatas=[document.metadata for document, _ in pairs],
+    )
+
+    # сохраняем рядом и переносим файлы на место; манифест с их хешами пишется последним,
+    # а загрузчик не примет файлы, не совпадающие с манифестом
+    tmp_path = f'{db_path}.tmp'
+    new_db.save_local(tmp_path)
+    hashes = file_hashes(tmp_path)
+    os.makedirs(db_path, exist_ok=True)
+    for name in INDEX_FILES:
+        os.replace(os.path.join(tmp_path, name), os.path.join(db_path, name))
+    os.rmdir(tmp_path)
+
+    # сжатые копии индекса, если они есть, перестраиваются до записи манифеста
+    for kind in QUANTIZED_KINDS:
+        if os.path.exists(quantized_index_path(db_path, kind)):
+            try:
+                report = write_quantized_index(db_path, kind)
+            except ValueError as e:
+                logging.warning(f"{e}: сжатый индекс удалён, бот будет использовать точный")
+                continue
+            logging.info(f"Сжатый индекс {kind} перестроен, recall@5: {report['recall']:.3f}")
+
+    manifest = {
+        'version': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'chunks': len(pairs),
+        'embedded': len(texts),
+        'reused': len(pairs) - len(missing),
+        'sources': sorted({document.metadata.get('source') for document, _ in pairs}),
+        'files': hashes,
+    }
+    manifest_tmp = os.path.join(db_path, f'{MANIFEST_NAME}.tmp')
+    with open(manifest_tmp, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=2)
+    os.replace(manifest_tmp, os.path.join(db_path, MANIFEST_NAME))
+    return manifest
+
+
+if __name__ == '__main__':
+    from classes.textbot import db_path, get_embeddings
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Обновляет индекс базы знаний нейро-консультанта.')
+    parser.add_argument('sources', nargs='+', help='файлы или папки с документами (.md, .txt)')
+    parser.add_argument('--db', default=db_path, help='папка индекса FAISS')
+    parser.add_argument('--chunk-size', type=int, default=1500, help='максимальная длина фрагмента в символах')
+    parser.add_argument('--batch-size', type=int, default=64, help='число фрагментов в одном запросе эмбеддингов')
+    parser.add_argument('--prune', action='store_true', help='удалить фрагменты источников, которые не переданы')
+    args = parser.parse_args()
+
+    result = ingest(args.sources, args.db, get_embeddings(), args.chunk_size, args.batch_size, args.prune)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -0,0 +1,211 @@
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+
+# сколько кнопок выбора помещается на одной странице меню
+PAGE_SIZE = 10
+# сколько кнопок с буквами помещается в одном ряду
+LETTERS_PER_ROW = 8
+
+# callback_data кнопок навигации по меню
+PAGE_PREFIX = 'page:'
+LETTER_PREFIX = 'letter:'
+SEARCH_DATA = 'search'
+PAGE_INFO_DATA = 'page_info'
+# возврат из отфильтрованного меню к полному списку
+FULL_LIST_DATA = 'full_list'
+MENU_NAVIGATION_PATTERN = f'^({PAGE_PREFIX}\\d+|{LETTER_PREFIX}.+|{SEARCH_DATA}|{PAGE_INFO_DATA}|{FULL_LIST_DATA})$'
+
+
+def main_menu_row():
+    """
+    Returns the keyboard row with the "main menu" button.
+
+    Returns:
+        list: A single-button keyboard row.
+    """
+    return [InlineKeyboardButton('В главное меню', callback_data='main_menu')]
+
+
+def full_list_row():
+    """
+    Returns the keyboard row that clears the filter of a menu and shows its first page.
+
+    Returns:
+        list: A single-button keyboard row.
+    """
+    return [InlineKeyboardButton('Весь список', callback_data=FULL_LIST_DATA)]
+
+
+def build_choice_markup(options, extra_rows=()):
+    """
+    Builds an inline keyboard with one button per option and the "main menu" button at the end.
+
+    Args:
+        options (list): (button text, callback data) pairs.
+        extra_rows (tuple): Keyboard rows placed before the "main menu" button.
+
+    Returns:
+        InlineKeyboardMarkup: The ready keyboard markup.
+    """
+    keyboard = [
+        [InlineKeyboardButton(text, callback_data=data)] for text, data in options
+    ] + list(extra_rows) + [main_menu_row()]
+    return InlineKeyboardMarkup(keyboard)
+
+
+def page_count(options):
+    """
+    Returns the number of menu pages needed for the options.
+
+    Args:
+        options (list): (button text, callback data) pairs.
+
+    Returns:
+        int: The number of pages, at least one.
+    """
+    return max(1, -(-len(options) // PAGE_SIZE))
+
+
+def build_menu_markup(options, page: int = 0, filtered: bool = False):
+    """
+    Builds one page of a choice menu.
+
+    Short lists are rendered as a plain choice keyboard. Longer lists are split into pages
+    of PAGE_SIZE buttons with "previous"/"next" buttons, a row of first-letter buckets
+    (when the options start with different letters) and a "search" button. A filtered
+    menu always gets a button back to the full list.
+
+    Args:
+        options (list): (button text, callback data) pairs.
+        page (int): The zero-based page number, clamped to the available pages.
+        filtered (bool): Whether the options are filtered by a letter or a search.
+
+    Returns:
+        InlineKeyboardMarkup: The ready keyboard markup.
+    """
+    extra_rows = [full_list_row()] if filtered else []
+    if len(options) <= PAGE_SIZE:
+        return build_choice_markup(options, extra_rows)
+
+    pages = page_count(options)
+    page = min(max(page, 0), pages - 1)
+    keyboard = [
+        [InlineKeyboardButton(text, callback_data=data)]
+        for text, data in options[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+    ]
+
+    navigation_row = []
+    if page > 0:
+        navigation_row.append(InlineKeyboardButton('◀', callback_data=f'{PAGE_PREFIX}{page - 1}'))
+    navigation_row.append(InlineKeyboardButton(f'{page + 1}/{pages}', callback_data=PAGE_INFO_DATA))
+    if page < pages - 1:
+        navigation_row.append(InlineKeyboardButton('▶', callback_data=f'{PAGE_PREFIX}{page + 1}'))
+    keyboard.append(navigation_row)
+
+    letters = sorted({text[:1].upper() for text, _ in options if text})
+    if len(letters) > 1:
+        letter_buttons = [InlineKeyboardButton(letter, callback_data=f'{LETTER_PREFIX}{letter}') for letter in letters]
+        keyboard += [letter_buttons[i:i + LETTERS_PER_ROW] for i in range(0, len(letter_buttons), LETTERS_PER_ROW)]
+
+    keyboard.append([InlineKeyboardButton('Поиск', callback_data=SEARCH_DATA)])
+    keyboard += extra_rows
+    keyboard.append(main_menu_row())
+    return InlineKeyboardMarkup(keyboard)
+
+
+def filter_options(options, menu_filter):
+    """
+    Filters the options of a menu.
+
+    Args:
+        options (list): (button text, callback data) pairs.
+        menu_filter (tuple): ('letter', letter) keeps the options starting with the letter,
+            ('search', text) keeps the options containing the text, case-insensitively.
+
+    Returns:
+        list: The matching options in their original order.
+    """
+    mode, value = menu_filter
+    value = value.casefold()
+    if mode == 'letter':
+        return [option for option in options if option[0].casefold().startswith(value)]
+    return [option for option in options if value in option[0].casefold()]
+
+
+class KeyboardCache:
+
+    def __init__(self, catalog):
+        """
+        Pre-renders the manufacturer, model and region keyboards of a catalog.
+
+        The markups depend only on the service type, the manufacturer and the page, so they
+        are built once per catalog and replaced together with it when the spreadsheets change.
+        The buttons carry the catalog's compact callback data instead of the names.
+
+        Args:
+            catalog (PriceCatalog): The catalog to render keyboards for.
+        """
+        self.main_menu_markup = InlineKeyboardMarkup([main_menu_row()])
+        self.regions_markup = build_choice_markup(
+            [(region, catalog.encode(catalog.REGION_KIND, region)) for region in catalog.regions])
+        # (тип услуги, производитель) -> варианты выбора; производитель None - список производителей
+        self._options = {}
+        for service_type, manufacturers in catalog.manufacturers.items():
+            self._options[(service_type, None)] = [
+                (manufacturer, catalog.encode(catalog.MANUFACTURER_KIND, manufacturer)) for manufacturer in manufacturers]
+            for manufacturer in manufacturers:
+                self._options[(service_type, manufacturer)] = [
+                    (model, catalog.encode(catalog.MODEL_KIND, model)) for model in catalog.get_models(service_type, manufacturer)]
+        # (тип услуги, производитель) -> клавиатуры всех страниц меню
+        self._markups = {
+            key: [build_menu_markup(options, page) for page in range(page_count(options))]
+            for key, options in self._options.items()
+        }
+
+    def has_menu(self, service_type: str, manufacturer: str = None):
+        """
+        Checks whether the catalog still has the menu of the service type and manufacturer.
+
+        Args:
+            service_type (str): Either 'service' or 'installation'.
+            manufacturer (str): The manufacturer name, or None for the list of manufacturers.
+
+        Returns:
+            bool: True if the menu exists in this catalog.
+        """
+        return (service_type, manufacturer) in self._options
+
+    def get(self, service_type: str, manufacturer: str = None, page: int = 0):
+        """
+        Returns the cached keyboard for the service type and manufacturer.
+
+        Args:
+            service_type (str): Either 'service' or 'installation'.
+            manufacturer (str): The manufacturer name, or None for the list of manufacturers.
+            page (int): The zero-based page number, clamped to the available pages.
+
+        Returns:
+            InlineKeyboardMarkup: The cached markup, or the "main menu" keyboard for unknown keys.
+        """
+        pages = self._markups.get((service_type, manufacturer))
+        if not pages:
+            return self.main_menu_markup
+        return pages[min(max(page, 0), len(pages) - 1)]
+
+    def get_filtered(self, service_type: str, manufacturer: str, menu_filter, page: int = 0):
+        """
+        Builds a keyboard with only the options matching the filter.
+
+        Filtered menus depend on the user's input, so they are rendered on demand.
+
+        Args:
+            service_type (str): Either 'service' or 'installation'.
+            manufacturer (str): The manufacturer name, or None for the list of manufacturers.
+            menu_filter (tuple): The filter, see filter_options.
+            page (int): The zero-based page number.
+
+        Returns:
+            tuple: (InlineKeyboardMarkup, number of matching options).
+        """
+        options = filter_options(self._options.get((service_type, manufacturer), []), menu_filter)
+        return build_menu_markup(options, page, filtered=True), len(options)
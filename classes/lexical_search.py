@@ -0,0 +1,124 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+
+# слова и артикулы вида "AB-123/4" целиком
+TOKEN_PATTERN = re.compile(r'\w+(?:[-./]\w+)*')
+# длина псевдоосновы русских и английских слов: "кондиционеры" и "кондиционера" дают одну основу
+STEM_LENGTH = 6
+# константа метода Reciprocal Rank Fusion
+RRF_K = 60
+
+
+def tokenize(text: str):
+    """
+    Splits the text into search terms.
+
+    Words are lowercased and cut to STEM_LENGTH letters as a cheap stemmer; tokens with digits
+    (model names, article numbers) are kept whole and also split into their parts.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        list: The terms in text order.
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower().replace('ё', 'е')):
+        if token.isalpha():
+            terms.append(token[:STEM_LENGTH])
+        else:
+            terms.append(token)
+            parts = re.split(r'[-./_]', token)
+            if len(parts) > 1:
+                terms += [part for part in parts if part]
+    return terms
+
+
+class BM25Index:
+
+    def __init__(self, documents, k1: float = 1.5, b: float = 0.75):
+        """
+        Initializes the BM25Index object.
+
+        Builds an inverted index of the documents for Okapi BM25 ranking.
+
+        Args:
+            documents (list): The documents (objects with `page_content`).
+            k1 (float): The term frequency saturation.
+            b (float): The document length normalization.
+        """
+        self.documents = list(documents)
+        self.k1 = k1
+        self.b = b
+        self._postings = defaultdict(list)
+        self._lengths = []
+        for position, document in enumerate(self.documents):
+            terms = Counter(tokenize(document.page_content))
+            self._lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                self._postings[term].append((position, frequency))
+        self._average_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0
+
+    @classmethod
+    def from_vectorstore(cls, db):
+        """
+        Builds the index over the chunks of a FAISS vectorstore.
+
+        Args:
+            db (FAISS): The vectorstore.
+
+        Returns:
+            BM25Index: The index of its documents in vector index order.
+        """
+        return cls(db.docstore.search(docstore_id) for _, docstore_id in sorted(db.index_to_docstore_id.items()))
+
+    def search(self, query: str, k: int):
+        """
+        Returns the documents that best match the query.
+
+        Args:
+            query (str): The query text.
+            k (int): The maximum number of documents.
+
+        Returns:
+            list: The documents with a positive score, best first.
+        """
+        scores = defaultdict(float)
+        count = len(self.documents)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, frequency in postings:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[position] / self._average_length)
+                scores[position] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        best = sorted(scores, key=lambda position: (-scores[position], position))[:k]
+        return [self.documents[position] for position in best]
+
+
+def reciprocal_rank_fusion(rankings, k: int, rrf_k: int = RRF_K):
+    """
+    Merges several rankings of documents with Reciprocal Rank Fusion.
+
+    Documents are identified by their text, so the same chunk found by both retrievers
+    is counted once with the sum of its scores.
+
+    Args:
+        rankings (list): Lists of documents, best first.
+        k (int): The maximum number of documents.
+        rrf_k (int): The rank offset; larger values flatten the difference between ranks.
+
+    Returns:
+        list: The documents with the highest fused score, best first.
+    """
+    scores = defaultdict(float)
+    documents = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking):
+            scores[document.page_content] += 1 / (rrf_k + rank + 1)
+            documents.setdefault(document.page_content, document)
+    best = sorted(scores, key=lambda text: -scores[text])[:k]
+    return [documents[text] for text in best]
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+
+import openai
+
+
+# ошибки провайдера, после которых запрос имеет смысл повторить
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+
+class QueueFullError(Exception):
+    """Raised when a request would wait in an already full limiter queue."""
+
+
+class AsyncLimiter:
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, window: int = 1000):
+        """
+        Initializes the AsyncLimiter object.
+
+        Admits at most `max_concurrent` requests at once; up to `max_queue` more wait for a free
+        slot, and further requests are rejected at once, so that a traffic spike gets a clear
+        refusal instead of slowing every user down.
+
+        Args:
+            name (str): The name of the limiter in the logs.
+            max_concurrent (int): The maximum number of requests running at once.
+            max_queue (int): The maximum number of waiting requests.
+            window (int): The number of last wait times kept for the metrics.
+        """
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.waiting = 0
+        self.rejected = 0
+        self._wait_times = deque(maxlen=window)
+
+    async def __aenter__(self):
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            logging.warning(f"Лимитер {self.name}: очередь заполнена, запрос отклонён (отклонено: {self.rejected})")
+            raise QueueFullError(self.name)
+        self.waiting += 1
+        start = time.monotonic()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self._wait_times.append(time.monotonic() - start)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._semaphore.release()
+
+    def stats(self):
+        """
+        Returns the wait time metrics of the last requests.
+
+        Returns:
+            dict: The number of waiting and rejected requests and the mean, 95th percentile
+            and maximum wait in seconds.
+        """
+        wait_times = sorted(self._wait_times)
+        if not wait_times:
+            return {'waiting': self.waiting, 'rejected': self.rejected, 'mean': 0.0, 'p95': 0.0, 'max': 0.0}
+        return {
+            'waiting': self.waiting,
+            'rejected': self.rejected,
+            'mean': sum(wait_times) / len(wait_times),
+            'p95': wait_times[min(int(len(wait_times) * 0.95), len(wait_times) - 1)],
+            'max': wait_times[-1],
+        }
+
+
+async def retry_with_jitter(request, attempts: int = 3, base_delay: float = 1.0, max_delay: float = 20.0):
+    """
+    Calls the request and repeats it after provider errors with exponential backoff and full jitter.
+
+    Args:
+        request (callable): The coroutine function to call without arguments.
+        attempts (int): The maximum number of calls.
+        base_delay (float): The backoff before the second call, in seconds.
+        max_delay (float): The maximum backoff, in seconds.
+
+    Returns:
+        The result of the request.
+    """
+    for attempt in range(attempts):
+        try:
+            return await request()
+        except RETRYABLE_ERRORS as e:
+            if attempt == attempts - 1:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            logging.warning(f"Ошибка провайдера, повтор через {delay:.1f} с: {e!r}")
+            await asyncio.sleep(delay)
@@ -0,0 +1,115 @@
+import bisect
+import re
+
+
+FENCE = '```'
+# часть короче этой доли лимита не режется по абзацу или предложению: лучше резать по пробелу
+MIN_FILL = 0.5
+
+_SENTENCE_END = re.compile(r'[.!?…]+["»)\]]*\s+')
+_BACKTICKS = re.compile(r'```|`')
+
+
+def _code_marks(text: str):
+    """
+    Finds the fences of code blocks and the backticks of inline code outside them.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        tuple: (positions of the fences, positions of the inline backticks), in ascending order.
+    """
+    fences = []
+    ticks = []
+    for match in _BACKTICKS.finditer(text):
+        if match.group() == FENCE:
+            fences.append(match.start())
+        elif len(fences) % 2 == 0:
+            ticks.append(match.start())
+    return fences, ticks
+
+
+def split_point(text: str, max_length: int):
+    """
+    Chooses where to cut the text so that the first part fits into `max_length`.
+
+    Paragraph breaks are preferred, then line breaks, sentence ends and spaces. Cuts that keep
+    code blocks and inline code whole come first; a code block longer than a message is cut
+    at a line break. A hard cut is the last resort.
+
+    Args:
+        text (str): The text.
+        max_length (int): The maximum length of the first part.
+
+    Returns:
+        int: The length of the first part.
+    """
+    if len(text) <= max_length:
+        return len(text)
+    window = text[:max_length]
+    fences, ticks = _code_marks(window)
+    min_length = int(max_length * MIN_FILL)
+
+    def outside_code(cut):
+        return bisect.bisect_left(fences, cut) % 2 == 0 and bisect.bisect_left(ticks, cut) % 2 == 0
+
+    def separators(separator):
+        position = window.rfind(separator)
+        while position >= min_length:
+            yield position + len(separator)
+            position = window.rfind(separator, 0, position)
+
+    sentence_ends = [match.end() for match in _SENTENCE_END.finditer(window, min_length)]
+    for candidates in (separators('\n\n'), separators('\n'), reversed(sentence_ends), separators(' ')):
+        for cut in candidates:
+            if outside_code(cut):
+                return cut
+    for separator in ('\n', ' '):
+        position = window.rfind(separator, 1)
+        if position > 0:
+            return position + 1
+    return max_length
+
+
+def take_part(text: str, max_length: int):
+    """
+    Takes the first message of a long text.
+
+    The text is not changed: the messages are shown escaped, so nothing is inserted to
+    balance the formatting, the cut is only placed where it does not break it.
+
+    Args:
+        text (str): The rest of the text.
+        max_length (int): The maximum length of one message.
+
+    Returns:
+        tuple: The message and the number of characters of `text` it consumed.
+    """
+    if len(text) <= max_length:
+        return text, len(text)
+    cut = split_point(text, max_length)
+    part = text[:cut].rstrip()
+    # пробелы и переносы на стыке сообщений не нужны
+    while cut < len(text) and text[cut].isspace():
+        cut += 1
+    return part, cut
+
+
+def split_message(text: str, max_length: int = 4096):
+    """
+    Splits a long answer into Telegram messages, lazily: the first message is ready before
+    the rest of the text is looked at.
+
+    Args:
+        text (str): The answer.
+        max_length (int): The maximum length of one message.
+
+    Yields:
+        str: The messages, none of them empty.
+    """
+    while text:
+        part, consumed = take_part(text, max_length)
+        text = text[consumed:]
+        if part.strip():
+            yield part
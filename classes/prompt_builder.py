@@ -0,0 +1,194 @@
+import logging
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+# оценка длины токена в символах, если tiktoken недоступен (для русского текста с запасом)
+CHARS_PER_TOKEN = 3
+# фрагмент базы знаний короче этого числа токенов после обрезки не добавляется
+MIN_CHUNK_TOKENS = 50
+CHUNK_SEPARATOR = '-' * 50
+
+
+class TokenCounter:
+
+    def __init__(self, encoding_name: str = 'o200k_base'):
+        """
+        Initializes the TokenCounter object.
+
+        Counts tokens with tiktoken when it is installed and its encoding can be loaded,
+        otherwise estimates them as CHARS_PER_TOKEN characters per token.
+
+        Args:
+            encoding_name (str): The tiktoken encoding of the model.
+        """
+        self.encoding_name = encoding_name
+        self._encoding = None
+        self._loaded = False
+
+    def _get_encoding(self):
+        """
+        Loads the tiktoken encoding on first use.
+
+        Returns:
+            tiktoken.Encoding | None: The encoding, or None if tiktoken is unavailable.
+        """
+        if not self._loaded:
+            self._loaded = True
+            if tiktoken is not None:
+                try:
+                    self._encoding = tiktoken.get_encoding(self.encoding_name)
+                except Exception as e:
+                    logging.warning(f"Не удалось загрузить кодировку {self.encoding_name}, токены считаются приблизительно: {e}")
+        return self._encoding
+
+    def count(self, text: str):
+        """
+        Returns the number of tokens in the text.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            int: The number of tokens.
+        """
+        encoding = self._get_encoding()
+        if encoding is None:
+            return -(-len(text) // CHARS_PER_TOKEN)
+        return len(encoding.encode(text))
+
+    def truncate(self, text: str, max_tokens: int):
+        """
+        Cuts the text to at most `max_tokens` tokens.
+
+        Args:
+            text (str): The text.
+            max_tokens (int): The maximum number of tokens.
+
+        Returns:
+            str: The text itself if it fits, otherwise its beginning.
+        """
+        encoding = self._get_encoding()
+        if encoding is None:
+            return text[:max(max_tokens, 0) * CHARS_PER_TOKEN]
+        tokens = encoding.encode(text)
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max(max_tokens, 0)])
+
+
+def dedup_chunks(chunks):
+    """
+    Removes repeated and overlapping knowledge base chunks.
+
+    A chunk is dropped if its text (with whitespace collapsed) is contained in a chunk
+    ranked higher; a higher-ranked chunk contained in a later one is replaced by it.
+
+    Args:
+        chunks (list): The chunk texts in relevance order.
+
+    Returns:
+        list: The remaining chunk texts in relevance order.
+    """
+    kept = []
+    for chunk in chunks:
+        normalized = ' '.join(chunk.split())
+        if any(normalized in other for _, other in kept):
+            continue
+        covered = [i for i, (_, other) in enumerate(kept) if other in normalized]
+        if covered:
+            kept[covered[0]] = (chunk, normalized)
+            kept = [item for i, item in enumerate(kept) if i not in covered[1:]]
+        else:
+            kept.append((chunk, normalized))
+    return [chunk for chunk, _ in kept]
+
+
+class PromptBuilder:
+
+    def __init__(self, budget: int = 8000, history_share: float = 0.25, history_entry_tokens: int = 300,
+                 counter: TokenCounter = None):
+        """
+        Initializes the PromptBuilder object.
+
+        Assembles the system and user messages of the neuro-consultant so that they fit into
+        `budget` tokens: the prompts and the question are always included, the chat history gets
+        up to `history_share` of the rest (newest turns first, each cut to `history_entry_tokens`),
+        and the knowledge base chunks fill the remaining space in relevance order.
+
+        Args:
+            budget (int): The maximum number of prompt tokens.
+            history_share (float): The share of the free budget available to the chat history.
+            history_entry_tokens (int): The maximum number of tokens of one history entry.
+            counter (TokenCounter): The token counter, a new one by default.
+        """
+        self.budget = budget
+        self.history_share = history_share
+        self.history_entry_tokens = history_entry_tokens
+        self.counter = counter or TokenCounter()
+
+    def build(self, system: str, user: str, topic: str, chunks, history):
+        """
+        Builds the messages for the completion.
+
+        Args:
+            system (str): The company's prompt.
+            user (str): The user's prompt template with {topic}, {message_content} and {chat_history}.
+            topic (str): The text of the user's message.
+            chunks (list): The knowledge base chunk texts in relevance order.
+            history (list): The formatted history entries, oldest first.
+
+        Returns:
+            tuple: (messages, message_content, history_content, report), where history_content is
+            the part of the chat history that made it into the prompt, empty if none did, and report
+            is a dict with the number of tokens per prompt part and the number of dropped chunks
+            and history entries.
+        """
+        count = self.counter.count
+        fixed_tokens = count(system) + count(user.format(topic=topic, message_content='', chat_history=''))
+        available = max(self.budget - fixed_tokens, 0)
+
+        history_budget = int(available * self.history_share)
+        kept_history, history_tokens = [], 0
+        for entry in reversed(history):
+            entry = self.counter.truncate(entry, self.history_entry_tokens)
+            tokens = count(entry) + 1
+            if history_tokens + tokens > history_budget:
+                break
+            kept_history.insert(0, entry)
+            history_tokens += tokens
+
+        unique_chunks = dedup_chunks(chunks)
+        chunks_budget = available - history_tokens
+        kept_chunks, chunk_tokens = [], 0
+        for chunk in unique_chunks:
+            text = f'{CHUNK_SEPARATOR}\n{chunk}'
+            tokens = count(text) + 1
+            if chunk_tokens + tokens > chunks_budget:
+                remaining = chunks_budget - chunk_tokens - 1
+                if remaining >= MIN_CHUNK_TOKENS:
+                    text = self.counter.truncate(text, remaining)
+                    kept_chunks.append(text)
+                    chunk_tokens += count(text) + 1
+                break
+            kept_chunks.append(text)
+            chunk_tokens += tokens
+
+        message_content = '\n'.join(kept_chunks)
+        history_content = '\n'.join(kept_history)
+        user_prompt = user.format(topic=topic, message_content=message_content, chat_history=history_content)
+        messages = [
+            {'role': 'system', 'content': system},
+            {'role': 'user', 'content': user_prompt}
+        ]
+        report = {
+            'prompt': fixed_tokens,
+            'history': history_tokens,
+            'chunks': chunk_tokens,
+            'total': fixed_tokens + history_tokens + chunk_tokens,
+            'budget': self.budget,
+            'dropped_chunks': len(chunks) - len(kept_chunks),
+            'dropped_history': len(history) - len(kept_history),
+        }
+        return messages, message_content, history_content, report
@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+
+# правки сообщения, из которых важна только последняя
+MERGEABLE_ENDPOINTS = ('editMessageText', 'editMessageReplyMarkup')
+# запросы, которые отправляются без ожидания очереди чата
+UNTHROTTLED_ENDPOINTS = ('answerCallbackQuery',)
+# после стольких чатов неактивные очереди чатов удаляются
+MAX_CHAT_BUCKETS = 10000
+
+
+class _TokenBucket:
+
+    def __init__(self, rate: float, burst: int):
+        """
+        Initializes the _TokenBucket object.
+
+        Args:
+            rate (float): The number of requests per second.
+            burst (int): The number of requests that may be sent at once after a pause.
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """
+        Stops the requests for the given time, as requested by Telegram.
+
+        Args:
+            seconds (float): The pause in seconds.
+        """
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    def refund(self):
+        """
+        Returns a token that was taken for a request that was not sent.
+        """
+        self._tokens = min(self.burst, self._tokens + 1)
+
+    def idle(self, now: float):
+        """
+        Tells whether the bucket is full again, so it can be dropped.
+
+        Args:
+            now (float): The current time.monotonic().
+
+        Returns:
+            bool: True if a new bucket would behave the same.
+        """
+        return now >= self._paused_until and self._tokens + (now - self._updated) * self.rate >= self.burst
+
+    async def acquire(self):
+        """
+        Waits until a request may be sent.
+        """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class TelegramRateLimiter(BaseRateLimiter):
+
+    def __init__(self, overall_rate: float = 30, private_rate: float = 1, private_burst: int = 3,
+                 group_rate: float = 20 / 60, group_burst: int = 3, max_retries: int = 3):
+        """
+        Initializes the TelegramRateLimiter object.
+
+        Spreads the bot's requests to stay within the Telegram limits: about 30 messages per second
+        overall, one per second in a private chat and 20 per minute in a group. Edits of the same
+        message that wait in the queue are merged: only the newest one is sent and the older callers
+        get its result, or its error. After a RetryAfter error the chat (or the whole bot, for requests without
+        a chat) is paused for the given time and the request is repeated.
+
+        Args:
+            overall_rate (float): The number of requests per second for the whole bot.
+            private_rate (float): The number of requests per second in a private chat.
+            private_burst (int): The number of requests sent at once in a private chat after a pause.
+            group_rate (float): The number of requests per second in a group chat.
+            group_burst (int): The number of requests sent at once in a group chat after a pause.
+            max_retries (int): The maximum number of repeats after RetryAfter errors.
+        """
+        self.overall_rate = overall_rate
+        self.private_rate = private_rate
+        self.private_burst = private_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self._overall = None
+        self._chats = {}
+        # последняя ожидающая правка каждого сообщения
+        self._edits = {}
+
+    async def initialize(self):
+        self._overall = _TokenBucket(self.overall_rate, max(1, int(self.overall_rate)))
+
+    async def shutdown(self):
+        self._chats.clear()
+        self._edits.clear()
+
+    def _chat_bucket(self, chat_id):
+        """
+        Returns the token bucket of a chat.
+
+        Args:
+            chat_id (int | str): The chat id; negative ids and @usernames are groups and channels.
+
+        Returns:
+            _TokenBucket: The bucket of the chat.
+        """
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                now = time.monotonic()
+                self._chats = {key: value for key, value in self._chats.items() if not value.idle(now)}
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = _TokenBucket(self.private_rate, self.private_burst)
+            else:
+                bucket = _TokenBucket(self.group_rate, self.group_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _send(self, callback, args, kwargs, chat_bucket, chat_acquired: bool = False):
+        """
+        Waits for the limits and makes the request, repeating it after RetryAfter errors.
+
+        Args:
+            callback (callable): The coroutine function that makes the request.
+            args (tuple): The positional arguments of the callback.
+            kwargs (dict): The keyword arguments of the callback.
+            chat_bucket (_TokenBucket): The bucket of the chat, None for requests without a chat.
+            chat_acquired (bool): Whether the chat token for the first attempt is already taken.
+
+        Returns:
+            The result of the request.
+        """
+        for attempt in range(self.max_retries + 1):
+            if chat_bucket is not None and not (chat_acquired and attempt == 0):
+                await chat_bucket.acquire()
+            await self._overall.acquire()
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                retry_after = e.retry_after
+                seconds = retry_after.total_seconds() if isinstance(retry_after, timedelta) else float(retry_after)
+                logging.warning(f"Telegram просит подождать {seconds} с, повтор {attempt + 1} из {self.max_retries}")
+                (chat_bucket or self._overall).pause(seconds)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        chat_bucket = None
+        if chat_id is not None and endpoint not in UNTHROTTLED_ENDPOINTS:
+            chat_bucket = self._chat_bucket(chat_id)
+
+        if endpoint not in MERGEABLE_ENDPOINTS or chat_bucket is None or data.get('message_id') is None:
+            return await self._send(callback, args, kwargs, chat_bucket)
+
+        key = (endpoint, chat_id, data['message_id'])
+        future = asyncio.get_running_loop().create_future()
+        self._edits[key] = future
+        try:
+            await chat_bucket.acquire()
+            latest = self._edits.get(key)
+            if latest is not future and latest is not None:
+                # пока правка ждала очереди, пришла более новая: отправится только она
+                chat_bucket.refund()
+                try:
+                    return await asyncio.shield(latest)
+                except asyncio.CancelledError:
+                    # отменили не нас, а более новую правку: отправляем свою
+                    if not latest.cancelled() or asyncio.current_task().cancelling():
+                        raise
+                    await chat_bucket.acquire()
+            result = await self._send(callback, args, kwargs, chat_bucket, chat_acquired=True)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+                # ту же ошибку получают и вызовы, чьи правки объединены с этой; exception() лишь
+                # помечает её полученной, чтобы asyncio не жаловался, если объединённых вызовов нет
+                future.exception()
+            raise
+        finally:
+            if self._edits.get(key) is future:
+                del self._edits[key]
@@ -1,22 +1,31 @@
-import pandas as pd
+import asyncio
+import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes, MessageHandler, ConversationHandler, filters, CallbackContext, CallbackQueryHandler
 from classes.States import States
+from classes.catalog import PriceCatalog, load_catalog
+from classes.executors import run_in_process
+from classes.keyboards import (
+    PAGE_PREFIX,
+    LETTER_PREFIX,
+    SEARCH_DATA,
+    PAGE_INFO_DATA,
+    FULL_LIST_DATA,
+    MENU_NAVIGATION_PATTERN,
+    main_menu_row,
+)
 
 from config.answers_const_service import (
     entry_text, 
     choice_manufacturer_text,
     choice_model_text,
     choice_region_text,
-    full_answer_text,
-    answer_without_repair_text,
-    answer_without_analysis_text,
-    empty_service_answer,
-    installation_answer_text,
-    installation_none_answer_text,
+    catalog_updated_text,
+    search_text,
+    search_empty_text,
     text_if_update_message,
     return_to_main_menu_text,
-    empty_installation_answer,
     to_hardware_extractor_text,
     quit_extractor_text,
     confirm_model_from_extractor
@@ -29,34 +38,6 @@ from config.answers_const_main import (
 
 
 
-service_xlsx = pd.read_excel('sheet_xlsx/service.xlsx')
-installation_xlsx = pd.read_excel('sheet_xlsx/installation.xlsx')
-
-def escape_markdown(text):
-
-    """
-    Escape special characters in a text string for MarkdownV2 parsing.
-
-    This function takes a text string and escapes characters that have
-    special meaning in MarkdownV2, ensuring that they are treated as 
-    literal characters. It is useful for preparing text to be safely
-    displayed in environments where MarkdownV2 is used, such as 
-    Telegram messages.
-
-    Args:
-        text (str): The text string to escape.
-
-    Returns:
-        str: The escaped text string, with special characters prefixed
-        by a backslash.
-    """
-
-    escape_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    for char in escape_chars:
-        text = text.replace(char, f'\\{char}')
-    return text
-
-
 async def remove_inline_keyboard(update: Update, context: CallbackContext):
 
     """
@@ -75,22 +56,94 @@ async def remove_inline_keyboard(update: Update, context: CallbackContext):
                 message_id=last_message_id,
                 reply_markup=None
             )
-        except Exception as e:
-            print(f"Error removing keyboard: {e}")
+        except TelegramError as e:
+            # RetryAfter уже повторён ограничителем запросов; сюда попадают, например, удалённые сообщения
+            logging.warning(f"Не удалось убрать клавиатуру: {e}")
         
 
+def entry_markup():
+    """
+    Returns the keyboard for selecting the service type.
+
+    Returns:
+        InlineKeyboardMarkup: The service type keyboard.
+    """
+    keyboard = [[InlineKeyboardButton('Разовые сервисы', callback_data='service')],
+                [InlineKeyboardButton('Инсталляция', callback_data='installation')],
+                [InlineKeyboardButton('В главное меню', callback_data='main_menu')]]
+    return InlineKeyboardMarkup(keyboard)
+
+
+def reset_menu(context: CallbackContext):
+    """
+    Forgets the menu the user was browsing, its filter and a pending search.
+
+    Called whenever the user leaves the manufacturer and model menus, so that a text typed
+    later is not taken for a search query of an old menu.
+
+    Args:
+        context: The Telegram context object with user data.
+    """
+    for key in ('menu', 'menu_filter', 'menu_search'):
+        context.user_data.pop(key, None)
+
+
 class ServiceInstallation:
     
-    def __init__(self, service_xlsx: pd.DataFrame, installation_xlsx: pd.DataFrame):
+    def __init__(self, catalog: PriceCatalog = None):
         """
         Initializes the ServiceInstallation object.
 
         Args:
-            service_xlsx (pd.DataFrame): The dataframe object of the 'service.xlsx' file.
-            installation_xlsx (pd.DataFrame): The dataframe object of the 'installation.xlsx' file.
+            catalog (PriceCatalog): The lookup tables built from 'service.xlsx' and 'installation.xlsx'.
+                If None, the spreadsheets are loaded on first use, see get_catalog.
         """
-        self.service_xlsx = service_xlsx
-        self.installation_xlsx = installation_xlsx
+        self.catalog = catalog
+        self._catalog_lock = asyncio.Lock()
+
+    async def get_catalog(self):
+        """
+        Returns the current price catalog, loading the spreadsheets on first use.
+
+        The spreadsheets are parsed in the process pool, and concurrent callers wait for the same load.
+
+        Returns:
+            PriceCatalog: The current catalog.
+        """
+        if self.catalog is None:
+            async with self._catalog_lock:
+                if self.catalog is None:
+                    catalog = await run_in_process('load_catalog', load_catalog)
+                    # каталог мог быть заменён CatalogWatcher, пока шла загрузка
+                    if self.catalog is None:
+                        self.catalog = catalog
+        return self.catalog
+
+    async def stale_button(self, update: Update, context: CallbackContext):
+        """
+        Handles a button or a search query made for a previous version of the price catalog.
+
+        The spreadsheets have changed since the keyboard was sent, so the user is asked
+        to select the service type again.
+
+        Args:
+            update: The Telegram update object containing an already answered callback query
+                or a text message.
+            context: The Telegram context object with user data.
+
+        Returns:
+            States.SERVICE_TYPE
+        """
+        reset_menu(context)
+        if update.callback_query:
+            await update.callback_query.edit_message_text(catalog_updated_text, reply_markup=entry_markup(), parse_mode='MarkdownV2')
+            return States.SERVICE_TYPE
+        _, sent_message = await asyncio.gather(
+            remove_inline_keyboard(update, context),
+            update.message.reply_text(catalog_updated_text, reply_markup=entry_markup(), parse_mode='MarkdownV2'))
+        context.user_data['last_bot_message_id'] = sent_message.message_id
+        return States.SERVICE_TYPE
+
     async def entry_point(self, update: Update, context: CallbackContext):
 
         """
@@ -108,13 +161,10 @@ class ServiceInstallation:
         """
 
         query = update.callback_query
-        await query.answer()
-        keyboard = [[InlineKeyboardButton('Разовые сервисы', callback_data='service')],
-                    [InlineKeyboardButton('Инсталляция', callback_data='installation')],
-                    [InlineKeyboardButton('В главное меню', callback_data='main_menu')]]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(entry_text, reply_markup=reply_markup, parse_mode='MarkdownV2')
+        reset_menu(context)
+        await asyncio.gather(
+            query.answer(),
+            query.edit_message_text(entry_text, reply_markup=entry_markup(), parse_mode='MarkdownV2'))
         return States.SERVICE_TYPE
 
     async def if_update_message(self, update: Update, context: CallbackContext):
@@ -131,16 +181,20 @@ class ServiceInstallation:
             context: The Telegram context object
 
         Returns:
-            States.IF_UPDATE_MESSAGE
+            States.IF_UPDATE_MESSAGE, or the current menu state if the text is a search query
         """
 
-        await remove_inline_keyboard(update, context)
+        if context.user_data.pop('menu_search', False):
+            return await self.search_menu(update, context)
         keyboard = [[InlineKeyboardButton('Нейро-консультант', callback_data='to_text_bot')],
                 [InlineKeyboardButton('Остаться', callback_data='stay_service')],
                 [InlineKeyboardButton('В главное меню', callback_data='main_menu')]]
 
         reply_markup = InlineKeyboardMarkup(keyboard)
-        sent_message  = await update.message.reply_text(text_if_update_message, reply_markup=reply_markup, parse_mode='MarkdownV2')
+        # клавиатура старого сообщения убирается одновременно с отправкой нового
+        _, sent_message = await asyncio.gather(
+            remove_inline_keyboard(update, context),
+            update.message.reply_text(text_if_update_message, reply_markup=reply_markup, parse_mode='MarkdownV2'))
         context.user_data['last_bot_message_id'] = sent_message.message_id
         return States.IF_UPDATE_MESSAGE
     
@@ -162,10 +216,12 @@ class ServiceInstallation:
             interaction and return to the main menu.
         """
         query = update.callback_query
-        await query.answer()
+        reset_menu(context)
         keyboard = [[InlineKeyboardButton('В главное меню', callback_data='main_menu')]]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        sent_message = await query.edit_message_text(return_to_main_menu_text, reply_markup=reply_markup, parse_mode='MarkdownV2')
+        _, sent_message = await asyncio.gather(
+            query.answer(),
+            query.edit_message_text(return_to_main_menu_text, reply_markup=reply_markup, parse_mode='MarkdownV2'))
         context.user_data['delete_message_id'] = sent_message.message_id
         return States.END
     
@@ -194,20 +250,15 @@ class ServiceInstallation:
                 manufacturer.
             """
             query = update.callback_query
-            await query.answer()
+            _, catalog = await asyncio.gather(query.answer(), self.get_catalog())
             if 'from_hardware_extractor' not in context.user_data:
                 context.user_data['service_type'] = query.data
             else:
                 del context.user_data['from_hardware_extractor']     
-            data = self.service_xlsx if context.user_data['service_type'] == 'service' else self.installation_xlsx
-            manufacturers = pd.unique(data['Производитель']).tolist()
-            reply_keyboard = [
-                [InlineKeyboardButton(manufacturer, callback_data=f'{manufacturer}')] for manufacturer in manufacturers
-            ] + [
-                [InlineKeyboardButton('В главное меню', callback_data='main_menu')]
-            ]
-
-            markup = InlineKeyboardMarkup(reply_keyboard)
+            reset_menu(context)
+            context.user_data['menu'] = (context.user_data['service_type'], None)
+            context.user_data['menu_filter'] = None
+            markup = catalog.keyboards.get(context.user_data['service_type'])
             await query.edit_message_text(choice_manufacturer_text, reply_markup=markup, parse_mode='MarkdownV2')
             return States.MANUFACTURER
 
@@ -230,20 +281,155 @@ class ServiceInstallation:
                 now select a model for the chosen manufacturer.
             """
             query = update.callback_query
-            await query.answer()
-            context.user_data['manufacturer_from_user'] = query.data
-            data = self.service_xlsx if context.user_data['service_type'] == 'service' else self.installation_xlsx
-            models = data[data['Производитель'] == context.user_data['manufacturer_from_user']]['Модель (category)'].tolist()
-            reply_keyboard = [
-                [InlineKeyboardButton(model, callback_data=f'{model}')] for model in models
-                ] + [
-                    [InlineKeyboardButton('В главное меню', callback_data='main_menu')]
-                ]
-
-            markup = InlineKeyboardMarkup(reply_keyboard)
+            _, catalog = await asyncio.gather(query.answer(), self.get_catalog())
+            manufacturer = catalog.decode(query.data, catalog.MANUFACTURER_KIND)
+            if manufacturer is None:
+                return await self.stale_button(update, context)
+            context.user_data['manufacturer_from_user'] = manufacturer
+            reset_menu(context)
+            context.user_data['menu'] = (context.user_data['service_type'], manufacturer)
+            context.user_data['menu_filter'] = None
+            markup = catalog.keyboards.get(context.user_data['service_type'], context.user_data['manufacturer_from_user'])
             await query.edit_message_text(choice_model_text, reply_markup=markup, parse_mode='MarkdownV2')
             return States.MODEL
 
+    def _menu_is_stale(self, catalog: PriceCatalog, context: CallbackContext):
+        """
+        Checks whether the menu the user is browsing is gone from the current catalog.
+
+        The navigation buttons and the search do not carry the catalog version, so after
+        CatalogWatcher swaps the catalog the menu is looked up again.
+
+        Args:
+            catalog (PriceCatalog): The current catalog.
+            context: The Telegram context object with user data.
+
+        Returns:
+            bool: True if the user has no menu or the catalog no longer has it.
+        """
+        menu = context.user_data.get('menu')
+        return menu is None or not catalog.keyboards.has_menu(*menu)
+
+    def _menu_state(self, context: CallbackContext):
+        """
+        Returns the conversation state of the menu the user is currently browsing.
+
+        Args:
+            context: The Telegram context object with user data.
+
+        Returns:
+            States.MANUFACTURER for the list of manufacturers, States.MODEL for a list of models.
+        """
+        _, manufacturer = context.user_data['menu']
+        return States.MANUFACTURER if manufacturer is None else States.MODEL
+
+    def _menu_text(self, context: CallbackContext):
+        """
+        Returns the prompt text of the menu the user is currently browsing.
+
+        Args:
+            context: The Telegram context object with user data.
+
+        Returns:
+            str: The MarkdownV2 prompt text.
+        """
+        _, manufacturer = context.user_data['menu']
+        return choice_manufacturer_text if manufacturer is None else choice_model_text
+
+    def _menu_markup(self, catalog: PriceCatalog, context: CallbackContext, page: int = 0):
+        """
+        Returns a page of the menu the user is currently browsing, with the user's filter applied.
+
+        Args:
+            catalog (PriceCatalog): The current catalog.
+            context: The Telegram context object with user data.
+            page (int): The zero-based page number.
+
+        Returns:
+            InlineKeyboardMarkup: The keyboard of the requested page.
+        """
+        service_type, manufacturer = context.user_data['menu']
+        menu_filter = context.user_data.get('menu_filter')
+        if menu_filter:
+            markup, _ = catalog.keyboards.get_filtered(service_type, manufacturer, menu_filter, page)
+            return markup
+        return catalog.keyboards.get(service_type, manufacturer, page)
+
+    async def handle_menu_navigation(self, update: Update, context: CallbackContext):
+        """
+        Handles the navigation buttons of the manufacturer and model menus.
+
+        The "previous"/"next" buttons switch the page, the letter buttons show only the options
+        starting with the letter, the "full list" button clears the filter and the "search" button
+        asks the user to type a part of the name, which is then handled by if_update_message.
+
+        Args:
+            update: The Telegram update object containing callback query.
+            context: The Telegram context object with user data.
+
+        Returns:
+            States.MANUFACTURER or States.MODEL: The user stays in the current menu.
+        """
+        query = update.callback_query
+        _, catalog = await asyncio.gather(query.answer(), self.get_catalog())
+        if self._menu_is_stale(catalog, context):
+            return await self.stale_button(update, context)
+        state = self._menu_state(context)
+        if query.data == PAGE_INFO_DATA:
+            return state
+        if query.data == SEARCH_DATA:
+            context.user_data['menu_search'] = True
+            context.user_data['menu_filter'] = None
+            keyboard = [[InlineKeyboardButton('Назад к списку', callback_data=FULL_LIST_DATA)], main_menu_row()]
+            await query.edit_message_text(search_text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='MarkdownV2')
+            context.user_data['last_bot_message_id'] = query.message.message_id
+            return state
+
+        context.user_data.pop('menu_search', None)
+        if query.data.startswith(LETTER_PREFIX):
+            context.user_data['menu_filter'] = ('letter', query.data[len(LETTER_PREFIX):])
+            page = 0
+        elif query.data == FULL_LIST_DATA:
+            context.user_data['menu_filter'] = None
+            page = 0
+        else:
+            page = int(query.data[len(PAGE_PREFIX):])
+        await query.edit_message_text(self._menu_text(context), reply_markup=self._menu_markup(catalog, context, page), parse_mode='MarkdownV2')
+        return state
+
+    async def search_menu(self, update: Update, context: CallbackContext):
+        """
+        Handles the text typed by the user after pressing the "search" button.
+
+        Shows the options of the current menu containing the text, or the whole menu
+        if nothing matches.
+
+        Args:
+            update: The Telegram update object
+            context: The Telegram context object
+
+        Returns:
+            States.MANUFACTURER or States.MODEL: The user stays in the current menu.
+        """
+        catalog = await self.get_catalog()
+        if self._menu_is_stale(catalog, context):
+            return await self.stale_button(update, context)
+        service_type, manufacturer = context.user_data['menu']
+        menu_filter = ('search', update.message.text.strip())
+        markup, found = catalog.keyboards.get_filtered(service_type, manufacturer, menu_filter)
+        if found:
+            context.user_data['menu_filter'] = menu_filter
+            text = self._menu_text(context)
+        else:
+            context.user_data['menu_filter'] = None
+            markup = catalog.keyboards.get(service_type, manufacturer)
+            text = search_empty_text
+        _, sent_message = await asyncio.gather(
+            remove_inline_keyboard(update, context),
+            update.message.reply_text(text, reply_markup=markup, parse_mode='MarkdownV2'))
+        context.user_data['last_bot_message_id'] = sent_message.message_id
+        return self._menu_state(context)
+
     async def handle_model(self, update: Update, context: CallbackContext):
             """
             Handles the model selection process.
@@ -265,9 +451,12 @@ class ServiceInstallation:
                 should be given the option to return to the main menu.
             """
             query = update.callback_query
-            await query.answer()
+            _, catalog = await asyncio.gather(query.answer(), self.get_catalog())
             if 'from_hardware_extractor' not in context.user_data:
-                context.user_data['model_from_user'] = query.data
+                model = catalog.decode(query.data, catalog.MODEL_KIND)
+                if model is None:
+                    return await self.stale_button(update, context)
+                context.user_data['model_from_user'] = model
             else:
                 del context.user_data['from_hardware_extractor']
                 
@@ -275,11 +464,7 @@ class ServiceInstallation:
                 await self.service_answer(update, context)
                 return States.END
             else:
-                regions = self.installation_xlsx.columns.tolist()[2:]
-                keyboard = [
-                    [InlineKeyboardButton(region, callback_data=f'{region}')] for region in regions
-                ] + [[InlineKeyboardButton('В главное меню', callback_data='main_menu')]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = catalog.keyboards.regions_markup
                 await query.edit_message_text(choice_region_text, reply_markup=reply_markup, parse_mode='MarkdownV2')
                 return States.REGION
 
@@ -300,8 +485,11 @@ class ServiceInstallation:
                 interaction after presenting the installation cost.
             """
             query = update.callback_query
-            await query.answer()
-            context.user_data['region_from_user'] = query.data
+            _, catalog = await asyncio.gather(query.answer(), self.get_catalog())
+            region = catalog.decode(query.data, catalog.REGION_KIND)
+            if region is None:
+                return await self.stale_button(update, context)
+            context.user_data['region_from_user'] = region
             await self.installation_answer(update, context)
             return States.END
 
@@ -310,8 +498,8 @@ class ServiceInstallation:
         Handles the service answer process.
 
         This function is triggered when the user selects a model for the service type.
-        It checks if the selected model is in the list of supported models and if so, 
-        calculates and presents the cost for the selected model.
+        It presents the answer with the costs for the selected model, prepared by the
+        catalog when it was loaded.
 
         Args:
             update: The Telegram update object containing callback query.
@@ -320,38 +508,9 @@ class ServiceInstallation:
         Returns:
             None
         """
-        models = self.service_xlsx['Модель (category)'].tolist()
-        if context.user_data['model_from_user']  in models:
-            
-            cost_repair = self.service_xlsx.loc[
-                (self.service_xlsx['Модель (category)'] == context.user_data['model_from_user']),
-                'Стоимость услуги 1'].values[0]
-            cost_analysis = self.service_xlsx.loc[
-                (self.service_xlsx['Модель (category)'] == context.user_data['model_from_user']),
-                'Стоимость услуги 2'].values[0]
-
-            if cost_repair != '-' and cost_analysis != '-':
-                answer_text = full_answer_text.format(model_from_user = escape_markdown(context.user_data['model_from_user']),
-                                                    
-                                                    cost_repair = cost_repair,
-                                                    cost_analysis = cost_analysis)
-            elif cost_repair == '-' and cost_analysis != '-':
-                answer_text = answer_without_repair_text.format(model_from_user = escape_markdown(context.user_data['model_from_user']),
-                                                    
-                                                    cost_analysis = cost_analysis)
-            elif cost_analysis == '-' and cost_repair != '-':
-                answer_text = answer_without_analysis_text.format(model_from_user = escape_markdown(context.user_data['model_from_user']),
-                                                    
-                                                    cost_repair = cost_repair)
-            else:
-                answer_text = empty_service_answer
-                
-        else:
-            answer_text = empty_service_answer
-        keyboard = [
-            [InlineKeyboardButton('В главное меню', callback_data=f'main_menu')], 
-            ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        catalog = await self.get_catalog()
+        answer_text = catalog.get_service_answer(context.user_data['model_from_user'])
+        reply_markup = catalog.keyboards.main_menu_markup
         sent_message = await update.callback_query.edit_message_text(answer_text, reply_markup=reply_markup, parse_mode='MarkdownV2')
         context.user_data['last_bot_message_id'] = sent_message.message_id
 
@@ -360,10 +519,10 @@ class ServiceInstallation:
         Handles the installation answer step in the service installation conversation.
 
         This function is called after the user has selected a region for the installation
-        of their equipment. The function gets the cost of installation from the Excel
-        spreadsheet and formats the answer text accordingly. If the cost of installation
-        is not available, it returns a message indicating that the installation is not
-        supported in the selected region.
+        of their equipment. The function presents the answer with the cost of installation,
+        prepared by the catalog when it was loaded. If the cost of installation is not
+        available, the answer says that the installation is not supported in the selected
+        region.
 
         Args:
             update: The Telegram update object containing callback query.
@@ -372,28 +531,10 @@ class ServiceInstallation:
         Returns:
             None
         """
-        models = self.installation_xlsx['Модель (category)'].tolist()
-        if context.user_data['model_from_user']  in models:
-            
-            cost_installation = self.installation_xlsx.loc[
-                (self.installation_xlsx['Модель (category)'] == context.user_data['model_from_user']),
-                context.user_data['region_from_user']].values[0]
-            if cost_installation == '-':
-                answer_text = installation_none_answer_text.format(model_from_user = escape_markdown(context.user_data['model_from_user']),
-                                                        
-                                                        region_from_user = escape_markdown(context.user_data['region_from_user']))
-            else:
-                answer_text = installation_answer_text.format(model_from_user = escape_markdown(context.user_data['model_from_user']),
-                                                        
-                                                        region_from_user = escape_markdown(context.user_data['region_from_user']),
-                                                        cost_installation = cost_installation)
-                
-        else:
-            answer_text = empty_installation_answer
-        keyboard = [
-            [InlineKeyboardButton('В главное меню', callback_data=f'main_menu')], 
-            ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        catalog = await self.get_catalog()
+        answer_text = catalog.get_installation_answer(context.user_data['model_from_user'],
+                                                      context.user_data['region_from_user'])
+        reply_markup = catalog.keyboards.main_menu_markup
         sent_message = await update.callback_query.edit_message_text(answer_text, reply_markup=reply_markup, parse_mode='MarkdownV2')
         context.user_data['last_bot_message_id'] = sent_message.message_id
         
@@ -413,58 +554,78 @@ class ServiceInstallation:
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)       
         if update.message:
-            await remove_inline_keyboard(update, context)
-            sent_message = await update.message.reply_text(transition_to_text_bot, reply_markup=reply_markup, parse_mode='MarkdownV2')
+            _, sent_message = await asyncio.gather(
+                remove_inline_keyboard(update, context),
+                update.message.reply_text(transition_to_text_bot, reply_markup=reply_markup, parse_mode='MarkdownV2'))
             context.user_data['last_bot_message_id'] = sent_message.message_id
             return States.TO_TEXT_BOT
         else:
             query = update.callback_query
-            await query.answer()
             if query.data == 'to_text_bot':
-                await query.edit_message_text(transition_to_text_bot, reply_markup=reply_markup, parse_mode='MarkdownV2')
+                await asyncio.gather(
+                    query.answer(),
+                    query.edit_message_text(transition_to_text_bot, reply_markup=reply_markup, parse_mode='MarkdownV2'))
                 return States.TO_TEXT_BOT
             else:
+                # entry_point сам отвечает на запрос
                 return await self.entry_point(update, context)
             
 
 
-service_bot = ServiceInstallation(service_xlsx, installation_xlsx)
-service_conversation_handler =  ConversationHandler(
-            entry_points=[
-                          CallbackQueryHandler(service_bot.return_to_main_menu, pattern='main_menu'),
-                          CallbackQueryHandler(service_bot.entry_point),
-                          MessageHandler(filters.TEXT & ~filters.COMMAND, service_bot.if_update_message)
-                          ],
-            states={
-                States.SERVICE_TYPE: [
-                                      CallbackQueryHandler(service_bot.return_to_main_menu, pattern='main_menu'),
-                                      CallbackQueryHandler(service_bot.handle_service_type),
-                                      MessageHandler(filters.TEXT & ~filters.COMMAND, service_bot.if_update_message)
-                                      ],
-                States.MANUFACTURER: [
-                                      CallbackQueryHandler(service_bot.return_to_main_menu, pattern='main_menu'),
-                                      CallbackQueryHandler(service_bot.handle_manufacturer),                                    
-                                      MessageHandler(filters.TEXT & ~filters.COMMAND, service_bot.if_update_message)
-                                      ],
-                States.MODEL: [
-                                      CallbackQueryHandler(service_bot.return_to_main_menu, pattern='main_menu'),
-                                      CallbackQueryHandler(service_bot.handle_model),
-                                      MessageHandler(filters.TEXT & ~filters.COMMAND, service_bot.if_update_message)
-                                      ],
-                States.REGION: [
-                                      CallbackQueryHandler(service_bot.return_to_main_menu, pattern='main_menu'),
-                                      CallbackQueryHandler(service_bot.handle_region),
-                                      MessageHandler(filters.TEXT & ~filters.COMMAND, service_bot.if_update_message)
-                                      ],
-                States.IF_UPDATE_MESSAGE: [
-                                      CallbackQueryHandler(service_bot.return_to_main_menu, pattern='main_menu'),
-                                      CallbackQueryHandler(service_bot.update_message_handler),
-                                      MessageHandler(filters.TEXT & ~filters.COMMAND, service_bot.update_message_handler)
-                                      ],
-                },
-            fallbacks=[],
-            map_to_parent={
-                States.END: States.MAIN_MENU,
-                States.TO_TEXT_BOT: States.CHAT_BOT,
-                }
-           )
\ No newline at end of file
+service_bot = ServiceInstallation()
+def build_service_conversation_handler(persistent: bool = False):
+    """
+    Builds the conversation handler of the service and installation menus.
+
+    The handler is nested into the main conversation and must be persistent exactly when
+    the main one is, i.e. when the application has a persistence.
+
+    Args:
+        persistent (bool): Whether the conversation states are saved by the application's persistence.
+
+    Returns:
+        ConversationHandler: The handler to put into the States.SERVICE_BOT state of the main conversation.
+    """
+    return ConversationHandler(
+                entry_points=[
+                              CallbackQueryHandler(service_bot.return_to_main_menu, pattern='main_menu'),
+                              CallbackQueryHandler(service_bot.entry_point),
+                              MessageHandler(filters.TEXT & ~filters.COMMAND, service_bot.if_update_message)
+                              ],
+                states={
+                    States.SERVICE_TYPE: [
+                                          CallbackQueryHandler(service_bot.return_to_main_menu, pattern='main_menu'),
+                                          CallbackQueryHandler(service_bot.handle_service_type),
+                                          MessageHandler(filters.TEXT & ~filters.COMMAND, service_bot.if_update_message)
+                                          ],
+                    States.MANUFACTURER: [
+                                          CallbackQueryHandler(service_bot.return_to_main_menu, pattern='main_menu'),
+                                          CallbackQueryHandler(service_bot.handle_menu_navigation, pattern=MENU_NAVIGATION_PATTERN),
+                                          CallbackQueryHandler(service_bot.handle_manufacturer),                                    
+                                          MessageHandler(filters.TEXT & ~filters.COMMAND, service_bot.if_update_message)
+                                          ],
+                    States.MODEL: [
+                                          CallbackQueryHandler(service_bot.return_to_main_menu, pattern='main_menu'),
+                                          CallbackQueryHandler(service_bot.handle_menu_navigation, pattern=MENU_NAVIGATION_PATTERN),
+                                          CallbackQueryHandler(service_bot.handle_model),
+                                          MessageHandler(filters.TEXT & ~filters.COMMAND, service_bot.if_update_message)
+                                          ],
+                    States.REGION: [
+                                          CallbackQueryHandler(service_bot.return_to_main_menu, pattern='main_menu'),
+                                          CallbackQueryHandler(service_bot.handle_region),
+                                          MessageHandler(filters.TEXT & ~filters.COMMAND, service_bot.if_update_message)
+                                          ],
+                    States.IF_UPDATE_MESSAGE: [
+                                          CallbackQueryHandler(service_bot.return_to_main_menu, pattern='main_menu'),
+                                          CallbackQueryHandler(service_bot.update_message_handler),
+                                          MessageHandler(filters.TEXT & ~filters.COMMAND, service_bot.update_message_handler)
+                                          ],
+                    },
+                fallbacks=[],
+                name='service_conversation',
+                persistent=persistent,
+                map_to_parent={
+                    States.END: States.MAIN_MENU,
+                    States.TO_TEXT_BOT: States.CHAT_BOT,
+                    }
+               )
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+
+import aiohttp
+from telegram import Update
+
+
+# заголовок обновления, уже переданного воркеру-владельцу чата
+FORWARDED_HEADER = 'X-Bot-Forwarded'
+
+
+def update_shard(update: Update, worker_count: int):
+    """
+    Returns the worker that owns the chat of the update.
+
+    All updates of a chat go to the same worker, so its conversation state lives in one
+    process; updates without a chat are spread by the user, then by the update id.
+
+    Args:
+        update (Update): The update.
+        worker_count (int): The number of workers.
+
+    Returns:
+        int: The index of the worker.
+    """
+    if update.effective_chat is not None:
+        key = update.effective_chat.id
+    elif update.effective_user is not None:
+        key = update.effective_user.id
+    else:
+        key = update.update_id
+    return key % worker_count
+
+
+class ShardRouter:
+
+    def __init__(self, worker_index: int, worker_urls):
+        """
+        Initializes the ShardRouter object.
+
+        Several webhook workers behind a load balancer receive updates of any chat; each worker
+        handles the chats of its shard and forwards other updates to their owners.
+
+        Args:
+            worker_index (int): The index of this worker in `worker_urls`.
+            worker_urls (list): The webhook URLs of all workers, the same list for every worker.
+        """
+        self.worker_index = worker_index
+        self.worker_urls = list(worker_urls)
+        self._session = None
+
+    def owner(self, update: Update):
+        """
+        Returns the index of the worker that must handle the update.
+
+        Args:
+            update (Update): The update.
+
+        Returns:
+            int: The worker index.
+        """
+        return update_shard(update, len(self.worker_urls))
+
+    async def forward(self, owner: int, data: dict, headers: dict):
+        """
+        Passes the update to the worker that owns its chat.
+
+        Args:
+            owner (int): The index of the owning worker.
+            data (dict): The update as received from Telegram.
+            headers (dict): The headers to send, with the secret token.
+
+        Returns:
+            int: The HTTP status of the owner, 502 if it is unreachable, so that Telegram retries.
+        """
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        try:
+            async with self._session.post(self.worker_urls[owner], json=data,
+                                          headers={**headers, FORWARDED_HEADER: '1'}) as response:
+                return response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.warning(f"Воркер {owner} недоступен: {e!r}")
+            return 502
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import pickle
+import sqlite3
+import threading
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+
+class SQLitePersistence(BasePersistence):
+
+    def __init__(self, path: str, update_interval: float = 60):
+        """
+        Initializes the SQLitePersistence object.
+
+        Stores user data, chat data, bot data and conversation states in an SQLite file, so
+        chat histories and conversations survive restarts. Values are pickled; the database
+        calls run in a worker thread.
+
+        Several bot processes may share the file (WAL mode): before each update the application
+        refreshes the user, chat and bot data that another process has saved since this one last
+        read or wrote them. If both processes changed the same data, the saved version wins.
+
+        Args:
+            path (str): The path to the SQLite file.
+            update_interval (float): How often the application saves the data, in seconds.
+        """
+        super().__init__(store_data=PersistenceInput(callback_data=False), update_interval=update_interval)
+        self.path = path
+        self._lock = threading.Lock()
+        # последнее прочитанное или записанное этим процессом значение каждого ключа
+        self._seen = {}
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS persistence (kind TEXT, key TEXT, value BLOB, PRIMARY KEY (kind, key))')
+        self._connection.commit()
+
+    def _load(self, kind: str):
+        """
+        Reads all values of a kind.
+
+        Args:
+            kind (str): 'user', 'chat', 'bot' or 'conversation:<name>'.
+
+        Returns:
+            dict: Key mapped to the unpickled value.
+        """
+        with self._lock:
+            rows = self._connection.execute('SELECT key, value FROM persistence WHERE kind = ?', (kind,)).fetchall()
+            for key, value in rows:
+                self._seen[(kind, key)] = value
+        return {key: pickle.loads(value) for key, value in rows}
+
+    def _load_changed(self, kind: str, key: str):
+        """
+        Reads one value if another process has saved it since this one last saw it.
+
+        Args:
+            kind (str): 'user', 'chat' or 'bot'.
+            key (str): The key within the kind.
+
+        Returns:
+            The unpickled value, or None if it has not changed.
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT value FROM persistence WHERE kind = ? AND key = ?', (kind, key)).fetchone()
+            if row is None or row[0] == self._seen.get((kind, key)):
+                return None
+            self._seen[(kind, key)] = row[0]
+        return pickle.loads(row[0])
+
+    def _save(self, kind: str, key: str, value):
+        """
+        Writes one value.
+
+        Args:
+            kind (str): 'user', 'chat', 'bot' or 'conversation:<name>'.
+            key (str): The key within the kind.
+            value: The value to pickle.
+        """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._connection.execute('INSERT OR REPLACE INTO persistence (kind, key, value) VALUES (?, ?, ?)',
+                                     (kind, key, data))
+            self._connection.commit()
+            self._seen[(kind, key)] = data
+
+    def _delete(self, kind: str, key: str):
+        """
+        Deletes one value.
+
+        Args:
+            kind (str): 'user', 'chat', 'bot' or 'conversation:<name>'.
+            key (str): The key within the kind.
+        """
+        with self._lock:
+            self._connection.execute('DELETE FROM persistence WHERE kind = ? AND key = ?', (kind, key))
+            self._connection.commit()
+            self._seen.pop((kind, key), None)
+
+    async def get_user_data(self):
+        data = await asyncio.to_thread(self._load, 'user')
+        return {int(key): value for key, value in data.items()}
+
+    async def get_chat_data(self):
+        data = await asyncio.to_thread(self._load, 'chat')
+        return {int(key): value for key, value in data.items()}
+
+    async def get_bot_data(self):
+        data = await asyncio.to_thread(self._load, 'bot')
+        return data.get('bot', {})
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str):
+        data = await asyncio.to_thread(self._load, f'conversation:{name}')
+        return {tuple(json.loads(key)): state for key, state in data.items()}
+
+    async def update_user_data(self, user_id: int, data: dict):
+        await asyncio.to_thread(self._save, 'user', str(user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        await asyncio.to_thread(self._save, 'chat', str(chat_id), data)
+
+    async def update_bot_data(self, data: dict):
+        await asyncio.to_thread(self._save, 'bot', 'bot', data)
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def update_conversation(self, name: str, key: tuple, new_state):
+        if new_state is None:
+            await asyncio.to_thread(self._delete, f'conversation:{name}', json.dumps(list(key)))
+        else:
+            await asyncio.to_thread(self._save, f'conversation:{name}', json.dumps(list(key)), new_state)
+
+    async def drop_user_data(self, user_id: int):
+        await asyncio.to_thread(self._delete, 'user', str(user_id))
+
+    async def drop_chat_data(self, chat_id: int):
+        await asyncio.to_thread(self._delete, 'chat', str(chat_id))
+
+    async def _refresh(self, kind: str, key: str, data: dict):
+        value = await asyncio.to_thread(self._load_changed, kind, key)
+        if value is not None:
+            data.clear()
+            data.update(value)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        await self._refresh('user', str(user_id), user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        await self._refresh('chat', str(chat_id), chat_data)
+
+    async def refresh_bot_data(self, bot_data: dict):
+        await self._refresh('bot', 'bot', bot_data)
+
+    async def flush(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,115 @@
+import time
+
+from telegram import Message, InlineKeyboardMarkup
+from telegram.error import TelegramError
+
+from classes.markdown_v2 import escape_markdown
+from classes.message_splitter import take_part
+
+
+class StreamingReply:
+
+    def __init__(self, message: Message, reply_markup: InlineKeyboardMarkup = None,
+                 edit_interval: float = 1.0, max_length: int = 4096):
+        """
+        Initializes the StreamingReply object.
+
+        Shows a growing answer to the user: the first text is sent as a reply, later texts edit
+        that message at most once per `edit_interval` seconds. When the text no longer fits into
+        one message, the filled message is finalized at a paragraph or sentence boundary and the
+        rest continues in a new one.
+        The text is shown literally: it is escaped and sent with parse_mode MarkdownV2.
+
+        Args:
+            message (Message): The user's message to reply to.
+            reply_markup (InlineKeyboardMarkup): The keyboard attached to the last message when finished.
+            edit_interval (float): The minimum time between edits in seconds.
+            max_length (int): The maximum length of one Telegram message.
+        """
+        self.message = message
+        self.reply_markup = reply_markup
+        self.edit_interval = edit_interval
+        self.max_length = max_length
+        # сообщение бота, которое сейчас дополняется, и показанный в нём текст
+        self._sent = None
+        self._sent_text = ''
+        # позиция начала текущего сообщения в полном тексте ответа
+        self._offset = 0
+        self._last_edit = 0.0
+        # все отправленные сообщения ответа
+        self._messages = []
+
+    async def update(self, text: str):
+        """
+        Shows the answer received so far, unless the previous edit was too recent.
+
+        Args:
+            text (str): The whole answer received so far.
+        """
+        if self._sent is not None and time.monotonic() - self._last_edit < self.edit_interval:
+            return
+        await self._render(text, final=False)
+
+    async def finish(self, text: str):
+        """
+        Shows the complete answer and attaches the keyboard to its last message.
+
+        Args:
+            text (str): The complete answer.
+
+        Returns:
+            Message | None: The last message of the answer, None if the answer is empty.
+        """
+        await self._render(text, final=True)
+        return self._sent
+
+    async def discard(self):
+        """
+        Deletes the messages of an answer that was abandoned before it was finished.
+        """
+        for message in self._messages:
+            try:
+                await message.delete()
+            except TelegramError:
+                pass
+        self._messages = []
+        self._sent = None
+        self._sent_text = ''
+        self._offset = 0
+
+    async def _render(self, text: str, final: bool):
+        """
+        Brings the sent messages in line with the text.
+
+        Args:
+            text (str): The whole answer received so far.
+            final (bool): Whether this is the complete answer.
+        """
+        # заполненные сообщения дописываем до конца и переходим к следующему
+        while len(text) - self._offset > self.max_length:
+            part, consumed = take_part(text[self._offset:], self.max_length)
+            if part.strip():
+                await self._show(part, None)
+            self._offset += consumed
+            self._sent = None
+            self._sent_text = ''
+        part = text[self._offset:]
+        if part.strip():
+            await self._show(part, self.reply_markup if final else None)
+        self._last_edit = time.monotonic()
+
+    async def _show(self, part: str, reply_markup: InlineKeyboardMarkup):
+        """
+        Sends or edits the current message.
+
+        Args:
+            part (str): The text of the current message.
+            reply_markup (InlineKeyboardMarkup): The keyboard to attach, if any.
+        """
+        if self._sent is None:
+            self._sent = await self.message.reply_text(escape_markdown(part), reply_markup=reply_markup,
+                                                       parse_mode='MarkdownV2')
+            self._messages.append(self._sent)
+        elif part != self._sent_text or reply_markup is not None:
+            await self._sent.edit_text(escape_markdown(part), reply_markup=reply_markup, parse_mode='MarkdownV2')
+        self._sent_text = part
@@ -1,12 +1,27 @@
+import asyncio
+import hashlib
 import os
+import time
+import weakref
 from openai import AsyncOpenAI
 from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
 from dotenv import load_dotenv
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from classes.service_installation import remove_inline_keyboard
+from classes.answer_cache import SemanticAnswerCache
+from classes.embeddings_cache import CachedEmbeddings
+from classes.streaming_reply import StreamingReply
+from classes.markdown_v2 import escape_markdown
+from classes.message_splitter import split_message
+from classes.chat_history import get_chat_history
+from classes.chat_coalescer import ChatCoalescer
+from classes.limiter import AsyncLimiter, QueueFullError, retry_with_jitter
+from classes.executors import run_in_thread
+from classes.prompt_builder import PromptBuilder
+from classes.kb_index import DEFAULT_NPROBE, MANIFEST_NAME, load_knowledge_base
+from classes.lexical_search import BM25Index, reciprocal_rank_fusion
 
 
 from classes.States import States
@@ -18,6 +33,7 @@ from config.prompts_config import (
 
 from config.answers_const_main import (
     from_text_bot_to_main,
+    queue_full_text,
 )
 
 
@@ -25,15 +41,16 @@ load_dotenv()
 
 MAX_MESSAGE_LENGTH = 4096
 
-api_key = os.environ.get("OPENAI_VSEAPI_KEY")
-# api_key = os.environ.get("OPENAI_API_KEY")
-os.environ["OPENAI_API_KEY"] = api_key
+# ответ показывается по мере генерации; минимальный интервал между правками сообщения в секундах
+STREAM_ANSWERS = os.environ.get('STREAM_ANSWERS', '1') == '1'
+STREAM_EDIT_INTERVAL = 1.0
 
-client = AsyncOpenAI(base_url="https://api.vsegpt.ru/v1") ################################################################# убрать переадресацию
-
-embeddings = OpenAIEmbeddings(model='text-embedding-3-large', openai_api_base = "https://api.vsegpt.ru/v1/") ################################################################### убрать переадресацию
 db_path = os.path.join('db')
-db_main = FAISS.load_local(db_path, embeddings, allow_dangerous_deserialization = True)
+# сжатый индекс базы знаний (sq8, ivfpq), отображаемый в память; пусто - точный индекс
+FAISS_INDEX = os.environ.get('FAISS_INDEX') or None
+FAISS_NPROBE = int(os.environ.get('FAISS_NPROBE', DEFAULT_NPROBE))
+# как часто проверять, не обновлён ли индекс базы знаний, в секундах
+DB_CHECK_INTERVAL = 60
 
 model_gpt = 'openai/gpt-4o-mini' #####################################################################  
 
@@ -46,7 +63,223 @@ model_gpt = 'openai/gpt-4o-mini' ###############################################
 
 # model_gpt = 'gpt-4o' 
 
-async def company_answer(system, user, topic, db, chat_history, num_chunks, model, temperature):
+# сообщения, присланные с паузой меньше COALESCE_WINDOW секунд, объединяются в один вопрос
+chat_coalescer = ChatCoalescer(window=float(os.environ.get('COALESCE_WINDOW', 0.5)))
+
+# одновременные запросы к провайдеру и длина очереди ожидающих; при заполненной очереди пользователь получает отказ
+llm_limiter = AsyncLimiter('llm', max_concurrent=int(os.environ.get('LLM_CONCURRENCY', 8)),
+                           max_queue=int(os.environ.get('LLM_QUEUE_SIZE', 32)))
+embeddings_limiter = AsyncLimiter('embeddings', max_concurrent=int(os.environ.get('EMBEDDINGS_CONCURRENCY', 16)),
+                                  max_queue=int(os.environ.get('EMBEDDINGS_QUEUE_SIZE', 64)))
+
+# поиск фрагментов: hybrid - BM25 и эмбеддинги вместе, vector - только эмбеддинги, lexical - только BM25
+RETRIEVAL_MODE = os.environ.get('RETRIEVAL_MODE', 'hybrid')
+# если эмбеддинг запроса не получен за столько секунд, используется только BM25
+EMBEDDING_TIMEOUT = float(os.environ.get('EMBEDDING_TIMEOUT', 3))
+
+# промпт нейро-консультанта ограничивается PROMPT_TOKEN_BUDGET токенами
+prompt_builder = PromptBuilder(budget=int(os.environ.get('PROMPT_TOKEN_BUDGET', 8000)))
+
+# кеш ответов нейро-консультанта на похожие вопросы
+answer_cache = SemanticAnswerCache(max_size=512, ttl=24 * 60 * 60, threshold=0.95)
+
+# клиенты и база знаний создаются при первом обращении или при прогреве в post_init
+_client = None
+_embeddings = None
+_db_main = None
+_db_loaded_version = None
+_db_checked_at = 0.0
+_db_lock = asyncio.Lock()
+# хранилище -> BM25-индекс его фрагментов; старое хранилище уходит из словаря вместе с последним запросом к нему
+_lexical_indexes = weakref.WeakKeyDictionary()
+
+
+def get_api_key():
+    """
+    Returns the API key of the LLM provider from the environment.
+
+    Returns:
+        str: The API key.
+    """
+    return os.environ.get("OPENAI_VSEAPI_KEY")
+    # return os.environ.get("OPENAI_API_KEY")
+
+
+def get_client():
+    """
+    Returns the shared AsyncOpenAI client, creating it on first use.
+
+    The client does not retry by itself: retry_with_jitter is the only retry layer, and it
+    waits between attempts without holding a slot of llm_limiter.
+
+    Returns:
+        AsyncOpenAI: The client.
+    """
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(api_key=get_api_key(), base_url="https://api.vsegpt.ru/v1", max_retries=0) ################################################################# убрать переадресацию
+    return _client
+
+
+def get_embeddings():
+    """
+    Returns the shared embeddings client, creating it on first use.
+
+    The client is wrapped in a cache of already embedded texts; set EMBEDDINGS_CACHE_PATH
+    to keep the cache in an SQLite file between restarts. The client does not retry: a failed
+    or slow query embedding falls back to BM25 search instead, and the ingestion tool repeats
+    failed batches itself.
+
+    Returns:
+        CachedEmbeddings: The embeddings client.
+    """
+    global _embeddings
+    if _embeddings is None:
+        embeddings = OpenAIEmbeddings(model='text-embedding-3-large', openai_api_key=get_api_key(), openai_api_base = "https://api.vsegpt.ru/v1/", max_retries=0) ################################################################### убрать переадресацию
+        _embeddings = CachedEmbeddings(embeddings, persist_path=os.environ.get('EMBEDDINGS_CACHE_PATH'))
+    return _embeddings
+
+
+def _db_version():
+    """
+    Returns the version marker of the knowledge base on disk.
+
+    The ingestion tool (`python -m classes.kb_ingest`) replaces the manifest after the index files.
+
+    Returns:
+        int | None: The modification time of the manifest, None if there is no manifest.
+    """
+    try:
+        return os.stat(os.path.join(db_path, MANIFEST_NAME)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _load_knowledge_base(embeddings):
+    """
+    Loads the knowledge base vectorstore and builds the BM25 index of its chunks.
+
+    This is a blocking call: run it with `run_in_thread`.
+
+    Args:
+        embeddings (CachedEmbeddings): The embeddings client of the vectorstore.
+
+    Returns:
+        tuple: (FAISS vectorstore, BM25Index of the same chunks).
+    """
+    db = load_knowledge_base(db_path, embeddings, FAISS_INDEX, FAISS_NPROBE)
+    return db, BM25Index.from_vectorstore(db)
+
+
+async def get_db():
+    """
+    Returns the knowledge base vectorstore, loading it from `db_path` on first use.
+
+    The index is read in the shared thread pool, and concurrent callers wait for the same load.
+    With FAISS_INDEX set, the quantized index built by `python -m classes.kb_index` is
+    memory-mapped instead of the exact one. The BM25 index of the chunks is built in the same
+    task, and the vectorstore is published only together with it.
+    At most every DB_CHECK_INTERVAL seconds the manifest is checked, and an index updated
+    by the ingestion tool is loaded and swapped in.
+
+    Returns:
+        FAISS: The vectorstore that contains the company's knowledge base.
+    """
+    global _db_main, _db_loaded_version, _db_checked_at
+    if _db_main is not None and time.monotonic() - _db_checked_at < DB_CHECK_INTERVAL:
+        return _db_main
+    async with _db_lock:
+        if _db_main is None or time.monotonic() - _db_checked_at >= DB_CHECK_INTERVAL:
+            _db_checked_at = time.monotonic()
+            version = _db_version()
+            if _db_main is None:
+                db, lexical_index = await run_in_thread('load_knowledge_base', _load_knowledge_base, get_embeddings())
+                _lexical_indexes[db] = lexical_index
+                _db_main = db
+                _db_loaded_version = version
+            elif version != _db_loaded_version:
+                try:
+                    # пока идёт загрузка, запросы получают прежнее хранилище вместе с его BM25-индексом
+                    db, lexical_index = await run_in_thread('load_knowledge_base', _load_knowledge_base, get_embeddings())
+                    _lexical_indexes[db] = lexical_index
+                    _db_main = db
+                    _db_loaded_version = version
+                    answer_cache.clear()
+                    logging.info("База знаний перезагружена")
+                except Exception as e:
+                    logging.error(f"Ошибка перезагрузки базы знаний: {e}")
+    return _db_main
+
+
+async def warmup():
+    """
+    Creates the clients and loads the knowledge base and the tokenizer ahead of the first user question.
+    """
+    get_client()
+    await asyncio.gather(get_db(), run_in_thread('load_tokenizer', prompt_builder.counter.count, ''))
+
+
+def get_lexical_index(db):
+    """
+    Returns the BM25 index over the chunks of the vectorstore.
+
+    Args:
+        db (FAISS): The vectorstore returned by get_db.
+
+    Returns:
+        BM25Index: The lexical index of the same chunks, built together with the vectorstore.
+    """
+    return _lexical_indexes[db]
+
+
+async def retrieve(db, topic, num_chunks):
+    """
+    Finds the knowledge base chunks for the user's message.
+
+    In the 'hybrid' mode the BM25 search and the query embedding run at the same time, and their
+    results are merged with Reciprocal Rank Fusion, so exact matches of model names and article
+    numbers are not lost. If the embedding is not received
+    within EMBEDDING_TIMEOUT seconds (including the wait in the limiter queue), fails or is rejected
+    by a full queue, only the BM25 results are used.
+
+    Args:
+        db (FAISS): The vectorstore that contains the company's knowledge base.
+        topic (str): The text of the user's message.
+        num_chunks (int): The number of chunks to return.
+
+    Returns:
+        tuple: (embedding, docs), where embedding is the query vector or None if it was not used.
+    """
+    async def lexical():
+        if RETRIEVAL_MODE == 'vector':
+            return []
+        return await run_in_thread('bm25_search', get_lexical_index(db).search, topic, num_chunks)
+
+    if RETRIEVAL_MODE == 'lexical':
+        return None, await lexical()
+
+    async def embed():
+        async with embeddings_limiter:
+            return await db.embeddings.aembed_query(topic)
+
+    lexical_docs, embedding = await asyncio.gather(lexical(), asyncio.wait_for(embed(), EMBEDDING_TIMEOUT),
+                                                   return_exceptions=True)
+    if isinstance(lexical_docs, BaseException):
+        raise lexical_docs
+    if isinstance(embedding, BaseException):
+        if RETRIEVAL_MODE == 'vector' or not isinstance(embedding, Exception):
+            raise embedding
+        logging.warning(f"Эмбеддинг запроса не получен, используется поиск по словам: {embedding!r}")
+        return None, lexical_docs
+    if isinstance(db.embeddings, CachedEmbeddings):
+        logging.info(f"Кеш эмбеддингов: попаданий {db.embeddings.hits}, промахов {db.embeddings.misses}")
+    vector_docs = await run_in_thread('faiss_search', db.similarity_search_by_vector, embedding, num_chunks)
+    if RETRIEVAL_MODE == 'vector':
+        return embedding, vector_docs
+    return embedding, reciprocal_rank_fusion([vector_docs, lexical_docs], num_chunks)
+
+
+async def company_answer(system, user, topic, db, chat_history, num_chunks, model, temperature, on_delta=None):
     """
     Async function that makes an AI answer to the user's message based on the company's knowledge base.
 
@@ -55,60 +288,100 @@ async def company_answer(system, user, topic, db, chat_history, num_chunks, mode
         user (str): The user's prompt.
         topic (str): The text of the user's message.
         db (FAISS): The vectorstore that contains the company's knowledge base.
-        chat_history (str): The text of the user's previous messages.
+        chat_history (list): The user's previous messages and the AI's answers, one string per turn, oldest first.
         num_chunks (int): The number of chunks to use for the search.
         model (str): The model to use for the completion.
         temperature (float): The temperature to use for the completion.
+        on_delta (callable): If given, the completion is streamed and this coroutine function
+            is called with the answer received so far. The calls run outside the llm_limiter
+            slot, one at a time; chunks received during a call are shown by the next one.
 
     Returns:
         str: The AI's answer to the user's message based on the company's knowledge base.
     """
-    docs = await db.asimilarity_search(topic, num_chunks)
-    message_content = '\n'.join([f'{"-" * 50}\n{doc.page_content}' for doc in docs])
-    user = user.format(
-        topic=topic,
-        message_content=message_content,
-        chat_history=chat_history
-    )
-    messages = [
-        {'role': 'system', 'content': system},
-        {'role': 'user', 'content': user}
-    ]
-    completion = await client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=temperature
-    )
-    answer = completion.choices[0].message.content
+    embedding, docs = await retrieve(db, topic, num_chunks)
+    messages, message_content, history_content, report = await run_in_thread(
+        'build_prompt', prompt_builder.build, system, user, topic, [doc.page_content for doc in docs], chat_history)
+    logging.info(f"Токены промпта: {report}")
+
+    cache_key = None
+    if embedding is not None:
+        # попавшая в промпт история диалога входит в ключ: ответ с другой историей не переиспользуется
+        cache_key = hashlib.sha256(
+            '\0'.join([system, user, message_content, history_content, model, str(temperature)]).encode()).hexdigest()
+        answer = answer_cache.get(embedding, cache_key)
+        if answer is not None:
+            logging.info(f"Ответ из кеша (попаданий: {answer_cache.hits}, промахов: {answer_cache.misses})")
+            return answer
+
+    async def complete():
+        # каждая попытка занимает место в llm_limiter заново, паузы между попытками его не держат
+        showing = None
+        try:
+            async with llm_limiter:
+                if on_delta is None:
+                    completion = await get_client().chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature
+                    )
+                    return completion.choices[0].message.content
+                stream = await get_client().chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    stream=True
+                )
+                text = ''
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        text += delta
+                        # правка сообщения идёт отдельной задачей и не держит место в llm_limiter;
+                        # пока прежняя правка не закончилась, новые пропускаются
+                        if showing is not None and showing.done():
+                            showing.result()
+                            showing = None
+                        if showing is None:
+                            showing = asyncio.create_task(on_delta(text))
+            if showing is not None:
+                await showing
+            return text
+        except BaseException:
+            if showing is not None:
+                showing.cancel()
+                await asyncio.gather(showing, return_exceptions=True)
+            raise
+
+    answer = await retry_with_jitter(complete)
+    logging.info(f"Ожидание в очереди LLM: {llm_limiter.stats()}")
+    if cache_key is not None:
+        answer_cache.put(embedding, cache_key, answer)
     return answer
 
 
-async def get_answer(topic, chat_history, num_chunks, temperature):
+async def get_answer(topic, chat_history, num_chunks, temperature, on_delta=None):
     
     """
     Async function that makes an AI answer to the user's message based on the company's knowledge base.
 
     Args:
         topic (str): The text of the user's message.
-        chat_history (list): The list of dictionaries that contain the user's previous messages and the AI's answers.
+        chat_history (deque): The bounded history of dictionaries that contain the user's previous messages and the AI's answers.
         num_chunks (int): The number of chunks to use for the search.
         temperature (float): The temperature to use for the completion.
+        on_delta (callable): If given, awaited with the answer received so far while it is generated.
 
     Returns:
         str: The AI's answer to the user's message based on the company's knowledge base.
     """
-    if chat_history:
-        # Извлекаем последние 4 словаря
-        last_messages = chat_history[-4:]  
-        # Формируем список строк для каждой пары вопрос-ответ
-        history_list = [f"Вопрос клиента: {msg['Вопрос клиента']}, Ответ нейроконсультанта: {msg['Ответ нейроконсультанта']}" for msg in last_messages]
-        
-        # Объединяем их в одну строку, если нужно
-        last_four_messages = "\n".join(history_list)
-    else:
-        last_four_messages = ""
-        
-    main_answer = await company_answer(system_company, user_company, topic, db_main, last_four_messages, num_chunks, model_gpt, temperature)
+    # Извлекаем последние 4 словаря
+    last_messages = list(chat_history)[-4:]
+    # Формируем список строк для каждой пары вопрос-ответ; в промпт они попадают в пределах бюджета токенов
+    history_list = [f"Вопрос клиента: {msg['Вопрос клиента']}, Ответ нейроконсультанта: {msg['Ответ нейроконсультанта']}" for msg in last_messages]
+
+    db_main = await get_db()
+    main_answer = await company_answer(system_company, user_company, topic, db_main, history_list, num_chunks, model_gpt, temperature, on_delta)
     chat_history.append({'Вопрос клиента': topic, 'Ответ нейроконсультанта': main_answer})
     return main_answer 
 
@@ -124,39 +397,83 @@ async def text_bot(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context: The Telegram context object.
 
     Returns:
-        States.CHAT_BOT if the user sends a text message, States.MAIN_MENU if the user clicks the "main menu" button.
+        States.CHAT_BOT if the user sends a text message, None if the message was merged into a later one,
+        States.MAIN_MENU if the user clicks the "main menu" button.
     """
     if update.message:
         logging.info("text_bot вызван")
-        await remove_inline_keyboard(update, context)
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action='typing')
-        main_answer= await get_answer(update.message.text, context.user_data['chat_history'], num_chunks=5, temperature=0.1) 
-        message = main_answer
+        # уборка клавиатуры и индикатор набора идут параллельно с поиском и генерацией ответа
+        housekeeping = asyncio.gather(
+            remove_inline_keyboard(update, context),
+            context.bot.send_chat_action(chat_id=update.effective_chat.id, action='typing'),
+            return_exceptions=True)
         keyboard = [
             [InlineKeyboardButton('В главное меню', callback_data = 'main_menu')],
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        if len(message) > MAX_MESSAGE_LENGTH:
-        # Разбить сообщение на части
-            parts = [message[i:i + MAX_MESSAGE_LENGTH] for i in range(0, len(message), MAX_MESSAGE_LENGTH)]
-            for i, part in enumerate(parts):
-                if i == len(parts) - 1:  # Для последней части добавляем кнопку
-                    sent_message = await update.message.reply_text(part, reply_markup=reply_markup)
+        reply = StreamingReply(update.message, reply_markup, edit_interval=STREAM_EDIT_INTERVAL, max_length=MAX_MESSAGE_LENGTH) if STREAM_ANSWERS else None
+
+        async def answer(topic):
+            try:
+                return await get_answer(topic, get_chat_history(context.user_data), num_chunks=5, temperature=0.1,
+                                        on_delta=reply.update if reply else None)
+            except asyncio.CancelledError:
+                # пользователь дописал вопрос: недописанный ответ убираем
+                if reply:
+                    await reply.discard()
+                raise
+
+        async def deliver(main_answer):
+            if reply:
+                sent_message = await reply.finish(main_answer)
+                if sent_message is not None:
                     context.user_data['last_bot_message_id'] = sent_message.message_id
-                else:
-                    await update.message.reply_text(part)
-        else:
-            sent_message = await update.message.reply_text(message, reply_markup=reply_markup)
+                return States.CHAT_BOT
+
+            # длинный ответ делится по абзацам и предложениям; часть уходит, пока готовится следующая,
+            # а кнопка добавляется к последней части
+            last_part = None
+            sending = None
+            try:
+                for part in split_message(main_answer, MAX_MESSAGE_LENGTH):
+                    if last_part is not None:
+                        if sending is not None:
+                            await sending
+                        sending = asyncio.create_task(
+                            update.message.reply_text(escape_markdown(last_part), parse_mode='MarkdownV2'))
+                    last_part = part
+                if sending is not None:
+                    await sending
+            finally:
+                if sending is not None and not sending.done():
+                    sending.cancel()
+            if last_part is not None:
+                sent_message = await update.message.reply_text(escape_markdown(last_part), reply_markup=reply_markup,
+                                                               parse_mode='MarkdownV2')
+                context.user_data['last_bot_message_id'] = sent_message.message_id
+            return States.CHAT_BOT
+
+        # сообщения чата отвечаются по очереди; быстро присланные подряд объединяются в один вопрос,
+        # а у вопроса, объединённого с более поздним, состояние диалога не меняется (None)
+        try:
+            return await chat_coalescer.run(update.effective_chat.id, update.message.text, answer, deliver)
+        except QueueFullError:
+            sent_message = await update.message.reply_text(queue_full_text, reply_markup=reply_markup, parse_mode='MarkdownV2')
             context.user_data['last_bot_message_id'] = sent_message.message_id
-        return States.CHAT_BOT
+            return States.CHAT_BOT
+        finally:
+            for result in await housekeeping:
+                if isinstance(result, Exception):
+                    logging.warning(f"Ошибка подготовки ответа: {result!r}")
     else:
         query = update.callback_query
-        await query.answer()
-        await remove_inline_keyboard(update, context)
         keyboard = [
             [InlineKeyboardButton('В главное меню', callback_data = 'main_menu')],
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)        
-        sent_message = await query.message.reply_text(from_text_bot_to_main, reply_markup=reply_markup, parse_mode='MarkdownV2')
+        _, _, sent_message = await asyncio.gather(
+            query.answer(),
+            remove_inline_keyboard(update, context),
+            query.message.reply_text(from_text_bot_to_main, reply_markup=reply_markup, parse_mode='MarkdownV2'))
         context.user_data['delete_message_id'] = sent_message.message_id
         return States.MAIN_MENU
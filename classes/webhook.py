@@ -0,0 +1,119 @@
+import asyncio
+import hmac
+import logging
+import signal
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+from classes.sharding import FORWARDED_HEADER, ShardRouter
+
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+HEALTH_PATH = '/healthz'
+
+
+def create_web_app(application: Application, secret_token: str, path: str = '/telegram', router: ShardRouter = None):
+    """
+    Creates the HTTP server that receives updates from Telegram.
+
+    POST `path` accepts an update only with the secret token in the X-Telegram-Bot-Api-Secret-Token
+    header and puts it into the update queue of the application; with a `router`, updates of chats
+    owned by other workers are forwarded to them instead. GET HEALTH_PATH reports whether the
+    application is running, for the load balancer.
+
+    Args:
+        application (Application): The Telegram application.
+        secret_token (str): The secret token given to setWebhook.
+        path (str): The URL path of the webhook.
+        router (ShardRouter): The chat sharding between several workers, None for a single worker.
+
+    Returns:
+        web.Application: The aiohttp application.
+    """
+    async def handle_update(request: web.Request):
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), secret_token):
+            logging.warning(f"Webhook: запрос без верного секретного токена от {request.remote}")
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+            update = Update.de_json(data, application.bot)
+        except Exception as e:
+            logging.warning(f"Webhook: не удалось разобрать обновление: {e!r}")
+            return web.Response(status=400)
+        if router is not None and FORWARDED_HEADER not in request.headers:
+            owner = router.owner(update)
+            if owner != router.worker_index:
+                return web.Response(status=await router.forward(owner, data, {SECRET_HEADER: secret_token}))
+        await application.update_queue.put(update)
+        return web.Response()
+
+    async def handle_health(request: web.Request):
+        status = {
+            'running': application.running,
+            'pending_updates': application.update_queue.qsize(),
+            'worker': router.worker_index if router is not None else 0,
+        }
+        return web.json_response(status, status=200 if application.running else 503)
+
+    async def close_router(web_app):
+        await router.close()
+
+    web_app = web.Application()
+    web_app.router.add_post(path, handle_update)
+    web_app.router.add_get(HEALTH_PATH, handle_health)
+    if router is not None:
+        web_app.on_cleanup.append(close_router)
+    return web_app
+
+
+async def run_webhook(application: Application, secret_token: str, listen: str = '0.0.0.0', port: int = 8080,
+                      path: str = '/telegram', webhook_url: str = None, router: ShardRouter = None):
+    """
+    Runs the application with updates delivered by the webhook until SIGINT or SIGTERM.
+
+    Does what `run_polling` does for the polling mode: initializes and starts the application,
+    calls the post_init and post_shutdown hooks and stops everything on a signal. The webhook is
+    registered with Telegram only if `webhook_url` is given, so that of several workers behind
+    a load balancer only one has to do it.
+
+    Args:
+        application (Application): The Telegram application.
+        secret_token (str): The secret token that Telegram sends with every update.
+        listen (str): The address of the HTTP server.
+        port (int): The port of the HTTP server.
+        path (str): The URL path of the webhook.
+        webhook_url (str): The public base URL of the server, e.g. 'https://bot.example.com'.
+        router (ShardRouter): The chat sharding between several workers, None for a single worker.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    runner = web.AppRunner(create_web_app(application, secret_token, path, router))
+    await runner.setup()
+    try:
+        async with application:
+            if application.post_init:
+                await application.post_init(application)
+            if webhook_url:
+                await application.bot.set_webhook(webhook_url.rstrip('/') + path, secret_token=secret_token,
+                                                  allowed_updates=Update.ALL_TYPES)
+            await application.start()
+            try:
+                await web.TCPSite(runner, listen, port).start()
+                logging.info(f"Webhook слушает {listen}:{port}{path}")
+                await stop.wait()
+                await runner.cleanup()
+            finally:
+                # запущенное приложение останавливается до shutdown и при ошибке, например занятом порте
+                await application.stop()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+    finally:
+        await runner.cleanup()
@@ -35,3 +35,5 @@ from_text_bot_to_main = """
 instead_button_text = """
 Вы ввели текст вместо выбора кнопки\\. Пожалуйста, воспользуйтесь кнопками меню\\."""
 
+queue_full_text = """
+Сейчас нейро\\-консультант отвечает очень многим пользователям\\. Пожалуйста, повторите вопрос через минуту\\."""
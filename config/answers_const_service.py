@@ -8,6 +8,12 @@ entry_text = """
 choice_manufacturer_text = "Выберите производителя Вашего оборудования из доступных для данной услуги:"
 choice_model_text = "Выберите модель Вашего оборудования из доступных для данной услуги:"
 choice_region_text = 'Выберите Ваш регион:'
+catalog_updated_text = """
+Прайс\\-лист обновился, пожалуйста, выберите услугу заново:"""
+search_text = """
+Введите часть названия для поиска:"""
+search_empty_text = """
+По Вашему запросу ничего не найдено\\. Выберите из списка или нажмите *Поиск*, чтобы попробовать снова:"""
 to_hardware_extractor_text = """
 Попробовать определить оборудование по имеющимся данным о нем?"""
 
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, ConversationHandler, filters, CallbackContext, CallbackQueryHandler
@@ -5,8 +6,15 @@ from dotenv import load_dotenv
 import os
 
 
-from classes.service_installation import service_conversation_handler, remove_inline_keyboard
-from classes.textbot import text_bot
+from classes.service_installation import build_service_conversation_handler, remove_inline_keyboard, service_bot
+from classes.catalog_watcher import CatalogWatcher
+from classes.chat_history import new_chat_history
+from classes.sqlite_persistence import SQLitePersistence
+from classes.rate_limiter import TelegramRateLimiter
+from classes.webhook import run_webhook
+from classes.sharding import ShardRouter
+from classes import executors
+from classes.textbot import text_bot, warmup as text_bot_warmup
 
 
 from classes.States import States
@@ -27,6 +35,10 @@ TOKEN = os.environ.get("TOKEN")
 logging.getLogger('httpx').setLevel(logging.WARNING)
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 
+# фоновая проверка обновления прайс-листов и прогрев ресурсов, создаются в post_init
+catalog_watcher = None
+warmup_task = None
+
 
 async def start(update, context):
     """
@@ -46,7 +58,7 @@ async def start(update, context):
     """
 
     logging.info("start вызван")
-    context.user_data['chat_history'] = []
+    context.user_data['chat_history'] = new_chat_history()
     keyboard = [
         [InlineKeyboardButton("Нейро-консультант", callback_data='chat_bot')],
         [InlineKeyboardButton("Разовые сервисы / Инсталляция", callback_data='service_bot')],
@@ -115,21 +127,34 @@ async def main_menu(update: Update, context: CallbackContext) -> int:
     """
     logging.info("main_menu вызван")
     query = update.callback_query
-    await query.answer()
-    await remove_inline_keyboard(update, context)
-    if 'delete_message_id' in context.user_data:
-        await context.bot.delete_message(chat_id=query.message.chat_id, message_id=context.user_data['delete_message_id'])
-        del context.user_data['delete_message_id']
     keyboard = [
         [InlineKeyboardButton("Нейро-консультант", callback_data='chat_bot')],
         [InlineKeyboardButton("Разовые сервисы / Инсталляция", callback_data='service_bot')],
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    sent_message = await query.message.reply_text(
-        main_menu_text,
-        reply_markup=reply_markup,
-        parse_mode='MarkdownV2'
-    )
+    # ответ на нажатие, уборка старых сообщений и новое меню не зависят друг от друга
+    calls = [
+        query.answer(),
+        query.message.reply_text(
+            main_menu_text,
+            reply_markup=reply_markup,
+            parse_mode='MarkdownV2'
+        ),
+    ]
+    delete_message_id = context.user_data.pop('delete_message_id', None)
+    if delete_message_id is not None:
+        calls.append(context.bot.delete_message(chat_id=query.message.chat_id, message_id=delete_message_id))
+    # у удаляемого сообщения клавиатуру убирать незачем
+    if context.user_data.get('last_bot_message_id') != delete_message_id:
+        calls.append(remove_inline_keyboard(update, context))
+    # старое сообщение могло быть уже удалено или слишком старым для удаления: меню это не ломает
+    results = await asyncio.gather(*calls, return_exceptions=True)
+    sent_message = results[1]
+    if isinstance(sent_message, BaseException):
+        raise sent_message
+    for result in results:
+        if isinstance(result, Exception):
+            logging.warning(f"Ошибка уборки сообщений при переходе в главное меню: {result!r}")
     context.user_data['last_bot_message_id'] = sent_message.message_id
     return States.MAIN_MENU_HANDLER
 
@@ -151,7 +176,6 @@ async def main_menu_handler(update: Update, context: CallbackContext) -> int:
         bot modes: States.CHAT_BOT, States.SERVICE_BOT, or States.CONTRACT_BOT.
     """
     query = update.callback_query
-    await query.answer()
     logging.info(f"Нажата кнопка: {query.data}")
     if query.data == 'chat_bot':
         logging.info("Переход в режим чата")
@@ -159,12 +183,16 @@ async def main_menu_handler(update: Update, context: CallbackContext) -> int:
             [InlineKeyboardButton('В главное меню', callback_data = 'main_menu')],
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(transition_to_text_bot, reply_markup=reply_markup, parse_mode='MarkdownV2')
+        await asyncio.gather(
+            query.answer(),
+            query.edit_message_text(transition_to_text_bot, reply_markup=reply_markup, parse_mode='MarkdownV2'))
         return States.CHAT_BOT
     elif query.data == 'service_bot':
         logging.info("Переход в режим сервиса")
+        # service_start сам отвечает на запрос
         await service_start(update, context)
         return States.SERVICE_BOT
+    await query.answer()
 
 
     
@@ -190,6 +218,49 @@ async def text_instead_button(update: Update, context: CallbackContext):
 
         
 
+async def warmup():
+    """
+    Loads the price catalog and the knowledge base concurrently.
+
+    A failed warmup is only logged: the resources are loaded again on first use.
+    """
+    results = await asyncio.gather(service_bot.get_catalog(), text_bot_warmup(), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logging.error(f"Ошибка прогрева: {result}")
+    logging.info("Прогрев завершён")
+
+
+async def post_init(application: Application):
+    """
+    Starts the background tasks once the application is initialized.
+
+    The warmup runs in the background, so the bot starts answering /start right away.
+
+    Args:
+        application: The Telegram application object.
+    """
+    global catalog_watcher, warmup_task
+    warmup_task = asyncio.create_task(warmup())
+    catalog_watcher = CatalogWatcher(service_bot)
+    catalog_watcher.start()
+
+
+async def post_shutdown(application: Application):
+    """
+    Stops the background tasks and the worker pools when the application shuts down.
+
+    Args:
+        application: The Telegram application object.
+    """
+    if catalog_watcher is not None:
+        await catalog_watcher.stop()
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    logging.info(f"Время фоновых задач: {executors.task_timings()}")
+    executors.shutdown()
+
+
 def main():
 
     # точка входа в приложение
@@ -201,7 +272,26 @@ def main():
     :return: None
     """
 
-    application = Application.builder().token(TOKEN).concurrent_updates(True).build()
+    # PERSISTENCE_PATH - файл SQLite, в котором диалоги и история чата переживают перезапуск
+    persistence_path = os.environ.get('PERSISTENCE_PATH')
+    # несколько воркеров с общим файлом сохраняют данные чаще, чтобы видеть изменения друг друга
+    persistence_interval = float(os.environ.get('PERSISTENCE_UPDATE_INTERVAL', 60))
+    persistence = SQLitePersistence(persistence_path, update_interval=persistence_interval) if persistence_path else None
+
+    builder = (
+        Application.builder()
+        .token(TOKEN)
+        .concurrent_updates(True)
+        .rate_limiter(TelegramRateLimiter())
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    # TELEGRAM_API_URL - другой адрес Bot API, например python -m tools.fake_telegram
+    if os.environ.get('TELEGRAM_API_URL'):
+        builder = builder.base_url(os.environ['TELEGRAM_API_URL'])
+    application = builder.build()
     print('Бот запущен...')
 
 
@@ -216,18 +306,35 @@ def main():
                                 MessageHandler(filters.TEXT&~filters.COMMAND, text_instead_button)],
             States.CHAT_BOT: [MessageHandler(filters.TEXT&~filters.COMMAND, text_bot),
                               CallbackQueryHandler(text_bot)],
-            States.SERVICE_BOT: [service_conversation_handler],
+            States.SERVICE_BOT: [build_service_conversation_handler(persistent=persistence is not None)],
 
         },
         
         fallbacks=[],
+        name='main_conversation',
+        persistent=persistence is not None,
     )
 
     application.add_handler(main_handler)
 
 
 
-    application.run_polling()
+    # BOT_MODE=webhook - обновления приходят HTTP-запросами от Telegram, иначе бот опрашивает Telegram сам
+    if os.environ.get('BOT_MODE', 'polling') == 'webhook':
+        # WORKER_URLS - адреса webhook всех воркеров через запятую; чаты делятся между ними по id
+        worker_urls = [url.strip() for url in os.environ.get('WORKER_URLS', '').split(',') if url.strip()]
+        router = ShardRouter(int(os.environ.get('WORKER_INDEX', 0)), worker_urls) if len(worker_urls) > 1 else None
+        asyncio.run(run_webhook(
+            application,
+            secret_token=os.environ['WEBHOOK_SECRET'],
+            listen=os.environ.get('WEBHOOK_LISTEN', '0.0.0.0'),
+            port=int(os.environ.get('WEBHOOK_PORT', 8080)),
+            path=os.environ.get('WEBHOOK_PATH', '/telegram'),
+            webhook_url=os.environ.get('WEBHOOK_URL'),
+            router=router,
+        ))
+    else:
+        application.run_polling()
 
 
 
@@ -0,0 +1,39 @@
+from classes import answer_cache
+from classes.answer_cache import SemanticAnswerCache
+
+
+def test_similar_question_with_the_same_key_is_a_hit():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.put([1.0, 0.0], 'chunks-a', 'Монтаж стоит 5000')
+    assert cache.get([0.99, 0.05], 'chunks-a') == 'Монтаж стоит 5000'
+    assert cache.get([0.0, 1.0], 'chunks-a') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_changed_chunks_are_a_miss():
+    cache = SemanticAnswerCache()
+    cache.put([1.0, 0.0], 'chunks-a', 'Монтаж стоит 5000')
+    # та же формулировка, но в промпт попали другие фрагменты базы знаний
+    assert cache.get([1.0, 0.0], 'chunks-b') is None
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, 'monotonic', lambda: now[0])
+    cache = SemanticAnswerCache(ttl=60)
+    cache.put([1.0, 0.0], 'key', 'ответ')
+    now[0] += 59
+    assert cache.get([1.0, 0.0], 'key') == 'ответ'
+    now[0] += 2
+    assert cache.get([1.0, 0.0], 'key') is None
+    assert not cache._entries
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticAnswerCache(max_size=2)
+    cache.put([1.0, 0.0], 'key', 'первый')
+    cache.put([0.0, 1.0], 'key', 'второй')
+    assert cache.get([1.0, 0.0], 'key') == 'первый'
+    cache.put([-1.0, 0.0], 'key', 'третий')
+    assert cache.get([0.0, 1.0], 'key') is None
+    assert cache.get([1.0, 0.0], 'key') == 'первый'
@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+from classes.catalog import PriceCatalog
+from config.answers_const_service import empty_installation_answer
+
+
+def make_catalog(repair_cost=1000):
+    service = pd.DataFrame({
+        'Производитель': ['Альфа', 'Альфа', 'Бета'],
+        'Модель (category)': ['A-1', 'A-2', 'B.1'],
+        'Стоимость услуги 1': [repair_cost, '-', 3000],
+        'Стоимость услуги 2': [500, 700, '-'],
+    })
+    installation = pd.DataFrame({
+        'Производитель': ['Альфа'],
+        'Модель (category)': ['A-1'],
+        'Регион 1': [10000],
+        'Регион 2': ['-'],
+    })
+    return PriceCatalog(service, installation)
+
+
+def test_encode_decode_round_trip():
+    catalog = make_catalog()
+    for kind, names in ((catalog.MANUFACTURER_KIND, ['Альфа', 'Бета']),
+                        (catalog.MODEL_KIND, ['A-1', 'A-2', 'B.1']),
+                        (catalog.REGION_KIND, ['Регион 1', 'Регион 2'])):
+        for name in names:
+            data = catalog.encode(kind, name)
+            assert len(data.encode()) <= 64
+            assert catalog.decode(data, kind) == name
+
+
+def test_decode_rejects_other_versions_and_kinds():
+    catalog = make_catalog()
+    data = catalog.encode(catalog.MODEL_KIND, 'A-1')
+    assert catalog.decode(data, catalog.REGION_KIND) is None
+    assert catalog.decode(make_catalog(repair_cost=1500).encode(catalog.MODEL_KIND, 'A-1'), catalog.MODEL_KIND) is None
+    assert catalog.decode(f'{catalog.version}:m99', catalog.MODEL_KIND) is None
+    assert catalog.decode('service', catalog.MODEL_KIND) is None
+    # callback_data присылает клиент: цифры не из ASCII не должны доходить до int()
+    assert catalog.decode(f'{catalog.version}:m\u00b2', catalog.MODEL_KIND) is None
+    assert catalog.decode(f'{catalog.version}:m\u0661', catalog.MODEL_KIND) is None
+
+
+def test_answers_are_escaped():
+    catalog = make_catalog(repair_cost=1500.5)
+    assert 'A\\-1' in catalog.get_service_answer('A-1')
+    assert '1500\\.5' in catalog.get_service_answer('A-1')
+    assert catalog.get_installation_answer('A-1', 'Регион 3') == empty_installation_answer
+
+
+def test_invalid_cost_fails_at_load():
+    with pytest.raises(ValueError):
+        make_catalog(repair_cost=float('nan'))
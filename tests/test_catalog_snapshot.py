@@ -0,0 +1,56 @@
+import os
+
+import pandas as pd
+
+from classes import catalog_snapshot
+from classes.catalog_snapshot import build_snapshot, load_snapshot, read_sheets
+
+
+def write_workbook(path, cost):
+    pd.DataFrame({'Производитель': ['Альфа'], 'Модель (category)': ['A-1'], 'Стоимость услуги 1': [cost]}).to_excel(path, index=False)
+
+
+def make_workbooks(tmp_path):
+    service, installation = str(tmp_path / 'service.xlsx'), str(tmp_path / 'installation.xlsx')
+    write_workbook(service, 1000)
+    write_workbook(installation, 10000)
+    return service, installation, str(tmp_path / 'catalog.pkl')
+
+
+def touch(path, mtime_ns):
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_fresh_snapshot_is_used(tmp_path):
+    service, installation, snapshot = make_workbooks(tmp_path)
+    build_snapshot(service, installation, snapshot)
+    sheets = load_snapshot(service, installation, snapshot)
+    assert sheets is not None
+    assert sheets[0]['Стоимость услуги 1'].tolist() == [1000]
+
+
+def test_snapshot_is_invalidated_when_a_workbook_changes(tmp_path, monkeypatch):
+    service, installation, snapshot = make_workbooks(tmp_path)
+    build_snapshot(service, installation, snapshot)
+    touch(snapshot, 2 * 10 ** 18)
+
+    # содержимое изменилось, а время изменения не новее снимка (например, файл скопирован с сохранением времени)
+    write_workbook(service, 1500)
+    touch(service, 10 ** 18)
+    assert load_snapshot(service, installation, snapshot) is None
+    assert read_sheets(service, installation, snapshot)[0]['Стоимость услуги 1'].tolist() == [1500]
+
+    # книга новее снимка: снимок не читается вовсе
+    touch(service, 3 * 10 ** 18)
+    monkeypatch.setattr(catalog_snapshot, 'file_hash', None)
+    assert load_snapshot(service, installation, snapshot) is None
+
+
+def test_missing_or_broken_snapshot_falls_back_to_excel(tmp_path):
+    service, installation, snapshot = make_workbooks(tmp_path)
+    assert load_snapshot(service, installation, snapshot) is None
+    with open(snapshot, 'wb') as file:
+        file.write(b'not a pickle')
+    touch(snapshot, 2 * 10 ** 18)
+    assert load_snapshot(service, installation, snapshot) is None
+    assert read_sheets(service, installation, snapshot)[1]['Стоимость услуги 1'].tolist() == [10000]
@@ -0,0 +1,79 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from classes import catalog_watcher, executors
+from classes.catalog_watcher import CatalogWatcher
+
+
+def read_catalog(service_path, installation_path):
+    # вместо разбора Excel: версия каталога - содержимое файлов
+    contents = []
+    for path in (service_path, installation_path):
+        with open(path, encoding='utf-8') as file:
+            contents.append(file.read())
+    if 'недописан' in contents:
+        raise ValueError('файл ещё пишется')
+    return SimpleNamespace(version='+'.join(contents))
+
+
+def write(path, text, mtime_ns):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(text)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    monkeypatch.setattr(executors, 'PROCESS_WORKERS', 0)
+    monkeypatch.setattr(catalog_watcher, 'load_catalog', read_catalog)
+    service, installation = str(tmp_path / 'service.xlsx'), str(tmp_path / 'installation.xlsx')
+    write(service, 'сервис 1', 10 ** 18)
+    write(installation, 'монтаж 1', 10 ** 18)
+    return service, installation
+
+
+def test_unchanged_files_are_not_reloaded(files, monkeypatch):
+    service_bot = SimpleNamespace(catalog=read_catalog(*files))
+    watcher = CatalogWatcher(service_bot, *files, interval=1)
+    monkeypatch.setattr(catalog_watcher, 'load_catalog', None)
+    assert asyncio.run(watcher.check()) is False
+
+
+def test_changed_file_swaps_the_catalog(files):
+    service_bot = SimpleNamespace(catalog=read_catalog(*files))
+    watcher = CatalogWatcher(service_bot, *files, interval=1)
+    write(files[0], 'сервис 2', 2 * 10 ** 18)
+    assert asyncio.run(watcher.check()) is True
+    assert service_bot.catalog.version == 'сервис 2+монтаж 1'
+    # тот же момент изменения второй раз не перечитывается
+    assert asyncio.run(watcher.check()) is False
+
+
+def test_touched_file_with_the_same_contents_keeps_the_catalog(files):
+    catalog = read_catalog(*files)
+    service_bot = SimpleNamespace(catalog=catalog)
+    watcher = CatalogWatcher(service_bot, *files, interval=1)
+    write(files[0], 'сервис 1', 2 * 10 ** 18)
+    assert asyncio.run(watcher.check()) is False
+    assert service_bot.catalog is catalog
+
+
+def test_half_written_or_missing_file_keeps_the_catalog_until_it_is_complete(files):
+    catalog = read_catalog(*files)
+    service_bot = SimpleNamespace(catalog=catalog)
+    watcher = CatalogWatcher(service_bot, *files, interval=1)
+
+    os.remove(files[1])
+    assert asyncio.run(watcher.check()) is False
+    write(files[1], 'недописан', 2 * 10 ** 18)
+    with pytest.raises(ValueError):
+        asyncio.run(watcher.check())
+    assert service_bot.catalog is catalog
+
+    # дописанный файл подхватывается следующей проверкой
+    write(files[1], 'монтаж 2', 3 * 10 ** 18)
+    assert asyncio.run(watcher.check()) is True
+    assert service_bot.catalog.version == 'сервис 1+монтаж 2'
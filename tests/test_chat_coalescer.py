@@ -0,0 +1,62 @@
+import asyncio
+
+from classes.chat_coalescer import ChatCoalescer
+
+
+def test_burst_is_merged_into_one_question():
+    async def run():
+        coalescer = ChatCoalescer(window=0.05)
+        questions = []
+
+        async def answer(text):
+            questions.append(text)
+            return text.upper()
+
+        async def deliver(result):
+            return result
+
+        first = asyncio.create_task(coalescer.run(1, 'привет', answer, deliver))
+        await asyncio.sleep(0.01)
+        second = await coalescer.run(1, 'как дела', answer, deliver)
+        return await first, second, questions
+
+    assert asyncio.run(run()) == (None, 'ПРИВЕТ\nКАК ДЕЛА', ['привет\nкак дела'])
+
+
+def test_new_message_cancels_answer_in_progress():
+    async def run():
+        coalescer = ChatCoalescer(window=0.01)
+        started = asyncio.Event()
+        questions = []
+
+        async def answer(text):
+            questions.append(text)
+            if len(questions) == 1:
+                started.set()
+                await asyncio.sleep(10)
+            return text
+
+        async def deliver(result):
+            return result
+
+        first = asyncio.create_task(coalescer.run(1, 'первый', answer, deliver))
+        await started.wait()
+        second = await coalescer.run(1, 'второй', answer, deliver)
+        return await first, second, questions
+
+    assert asyncio.run(run()) == (None, 'первый\nвторой', ['первый', 'первый\nвторой'])
+
+
+def test_chats_are_independent():
+    async def run():
+        coalescer = ChatCoalescer(window=0.01)
+
+        async def answer(text):
+            return text
+
+        async def deliver(result):
+            return result
+
+        return await asyncio.gather(coalescer.run(1, 'а', answer, deliver), coalescer.run(2, 'б', answer, deliver))
+
+    assert asyncio.run(run()) == ['а', 'б']
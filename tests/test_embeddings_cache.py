@@ -0,0 +1,43 @@
+import asyncio
+
+from langchain_core.embeddings import Embeddings
+
+from classes.embeddings_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_persistent_cache_survives_restart(tmp_path):
+    path = str(tmp_path / 'embeddings.sqlite')
+    client = CountingEmbeddings()
+    first = CachedEmbeddings(client, persist_path=path)
+    vector = asyncio.run(first.aembed_query('Какая  цена?'))
+
+    second = CachedEmbeddings(client, persist_path=path)
+    assert asyncio.run(second.aembed_query('какая цена?')) == vector
+    assert second.embed_documents(['какая цена?', 'другой вопрос']) == [vector, [13.0, 1.0]]
+    assert client.calls == 2
+
+
+def test_documents_are_cached_by_their_exact_text():
+    client = CountingEmbeddings()
+    cache = CachedEmbeddings(client)
+    # фрагменты, отличающиеся только регистром или переносами, получают свои векторы
+    documents = ['Монтаж AB-123', 'МОНТАЖ AB-123', 'Монтаж\nAB-123', 'Монтаж AB-123']
+    assert cache.embed_documents(documents)[0] is not None
+    assert client.calls == 3
+    # вопросы пользователя нормализуются: повтор с другим регистром берётся из кеша
+    cache.embed_query('Сколько стоит монтаж?')
+    cache.embed_query('сколько  стоит МОНТАЖ?')
+    assert client.calls == 4
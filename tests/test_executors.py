@@ -0,0 +1,28 @@
+import asyncio
+import os
+
+from classes import executors
+
+
+def crash_once(marker):
+    # первый вызов убивает процесс пула, как OOM killer
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+    return os.getpid()
+
+
+def test_broken_process_pool_is_replaced(tmp_path, monkeypatch):
+    monkeypatch.setattr(executors, 'PROCESS_WORKERS', 1)
+    marker = str(tmp_path / 'crashed')
+
+    async def run():
+        try:
+            first = await executors.run_in_process('crash_once', crash_once, marker)
+            second = await executors.run_in_process('crash_once', crash_once, marker)
+            return first, second
+        finally:
+            executors.shutdown()
+
+    first, second = asyncio.run(run())
+    assert first == second != os.getpid()
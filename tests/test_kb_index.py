@@ -0,0 +1,50 @@
+import os
+
+import faiss
+import numpy as np
+import pytest
+
+from classes.kb_index import quantized_index_path, read_quantized_index, write_quantized_index
+
+
+def anonymous_memory():
+    # резидентная память процесса без страниц, разделяемых с файлами
+    resident, shared = open('/proc/self/statm').read().split()[1:3]
+    return (int(resident) - int(shared)) * os.sysconf('SC_PAGE_SIZE')
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    vectors = np.random.default_rng(0).random((2000, 256), dtype=np.float32)
+    index = faiss.IndexFlatL2(256)
+    index.add(vectors)
+    faiss.write_index(index, str(tmp_path / 'index.faiss'))
+    return str(tmp_path)
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/statm'), reason='нужен /proc')
+def test_sq8_index_is_memory_mapped(tmp_path):
+    vectors = np.random.default_rng(0).random((40000, 256), dtype=np.float32)
+    index = faiss.IndexScalarQuantizer(256, faiss.ScalarQuantizer.QT_8bit)
+    index.train(vectors)
+    index.add(vectors)
+    path = str(tmp_path / 'index_sq8.faiss')
+    faiss.write_index(index, path)
+    del index
+
+    before = anonymous_memory()
+    mapped = read_quantized_index(path)
+    mapped.search(vectors[:10], 5)
+    # коды занимают 10 МБ; отображённый в память индекс не копирует их в память процесса
+    assert anonymous_memory() - before < 2 * 1024 * 1024
+    assert mapped.ntotal == 40000
+
+
+def test_low_recall_index_is_refused(db_path):
+    path = quantized_index_path(db_path, 'sq8')
+    write_quantized_index(db_path, 'sq8')
+    assert os.path.exists(path)
+
+    with pytest.raises(ValueError):
+        write_quantized_index(db_path, 'sq8', min_recall=1.01)
+    assert not os.path.exists(path)
@@ -0,0 +1,72 @@
+import os
+import shutil
+
+import httpx
+import openai
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from classes import kb_index, kb_ingest
+from classes.kb_index import load_knowledge_base
+from classes.kb_ingest import ingest
+
+
+class LengthEmbeddings(Embeddings):
+
+    def embed_documents(self, texts):
+        return [[float(len(text)), float(text.count(' ')), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class FlakyEmbeddings(LengthEmbeddings):
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise openai.APIConnectionError(request=httpx.Request('POST', 'https://example.com/embeddings'))
+        return super().embed_documents(texts)
+
+
+def write_source(path, text):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(text)
+
+
+def test_loader_rejects_files_of_different_builds(tmp_path, monkeypatch):
+    monkeypatch.setattr(kb_index, 'LOAD_RETRY_DELAY', 0)
+    db_path = str(tmp_path / 'db')
+    source = str(tmp_path / 'faq.md')
+    write_source(source, 'Первая версия базы знаний.')
+    ingest([source], db_path, LengthEmbeddings())
+    old_faiss = str(tmp_path / 'old.faiss')
+    shutil.copy(os.path.join(db_path, 'index.faiss'), old_faiss)
+
+    write_source(source, 'Вторая версия базы знаний, заметно длиннее первой.\n\nИ ещё один абзац.')
+    ingest([source], db_path, LengthEmbeddings(), prune=True)
+    db = load_knowledge_base(db_path, LengthEmbeddings())
+    assert db.index.ntotal == len(db.index_to_docstore_id)
+
+    # новый index.pkl с прежним index.faiss - как при чтении посреди обновления
+    shutil.copy(old_faiss, os.path.join(db_path, 'index.faiss'))
+    with pytest.raises(ValueError):
+        load_knowledge_base(db_path, LengthEmbeddings())
+
+
+def test_failed_embedding_batch_is_repeated(tmp_path, monkeypatch):
+    monkeypatch.setattr(kb_ingest, 'EMBED_RETRY_DELAY', 0)
+    db_path = str(tmp_path / 'db')
+    source = str(tmp_path / 'faq.md')
+    write_source(source, 'Первый абзац базы знаний.\n\nВторой абзац базы знаний.')
+    embeddings = FlakyEmbeddings(failures=2)
+    manifest = ingest([source], db_path, embeddings, chunk_size=30, batch_size=1)
+    assert manifest['embedded'] == 2
+    assert embeddings.calls == 4
+
+    with pytest.raises(openai.APIConnectionError):
+        ingest([source], str(tmp_path / 'other'), FlakyEmbeddings(failures=kb_ingest.EMBED_ATTEMPTS))
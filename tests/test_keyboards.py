@@ -0,0 +1,18 @@
+from classes.keyboards import FULL_LIST_DATA, PAGE_SIZE, SEARCH_DATA, build_menu_markup
+
+
+def callback_data(markup):
+    return [button.callback_data for row in markup.inline_keyboard for button in row]
+
+
+def test_short_filtered_menu_has_full_list_button():
+    options = [(f'Модель {i}', str(i)) for i in range(3)]
+    assert FULL_LIST_DATA in callback_data(build_menu_markup(options, filtered=True))
+    assert FULL_LIST_DATA not in callback_data(build_menu_markup(options))
+
+
+def test_long_filtered_menu_has_full_list_and_search_buttons():
+    options = [(f'Модель {i}', str(i)) for i in range(PAGE_SIZE * 2)]
+    data = callback_data(build_menu_markup(options, page=1, filtered=True))
+    assert FULL_LIST_DATA in data and SEARCH_DATA in data
+    assert data[-1] == 'main_menu'
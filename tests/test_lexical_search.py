@@ -0,0 +1,38 @@
+from langchain_core.documents import Document
+
+from classes.lexical_search import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def make_documents(*texts):
+    return [Document(page_content=text) for text in texts]
+
+
+def test_model_names_are_kept_whole_and_split():
+    assert tokenize('Кондиционеры AB-123/4') == ['кондиц', 'ab-123/4', 'ab', '123', '4']
+
+
+def test_bm25_ranks_exact_model_matches_first():
+    documents = make_documents(
+        'Монтаж кондиционера стоит от 5000 рублей.',
+        'Сервисное обслуживание кондиционеров AB-123 раз в год.',
+        'Гарантия на кондиционеры AB-123 и AB-456 три года, на монтаж кондиционеров год.',
+        'Доставка по городу бесплатно.',
+    )
+    index = BM25Index(documents)
+    assert index.search('AB-123', 5) == [documents[1], documents[2]]
+    # редкое слово весит больше частого: "доставка" важнее "кондиционер"
+    assert index.search('доставка кондиционера', 1) == [documents[3]]
+    assert index.search('холодильник', 5) == []
+
+
+def test_rrf_ranks_chunk_found_by_both_retrievers_first():
+    both, vector_only, lexical_only = make_documents('Монтаж AB-123', 'Монтаж сплит-системы', 'Артикул AB-123')
+    # повтор того же текста из другого поиска считается одним фрагментом
+    fused = reciprocal_rank_fusion([[vector_only, both], [lexical_only, Document(page_content='Монтаж AB-123')]], 3)
+    assert fused[0] is both
+    assert [document.page_content for document in fused[1:]] == ['Монтаж сплит-системы', 'Артикул AB-123']
+
+
+def test_rrf_keeps_at_most_k_documents():
+    documents = make_documents(*(f'Фрагмент {i}' for i in range(5)))
+    assert reciprocal_rank_fusion([documents, documents[::-1]], 2) == [documents[0], documents[4]]
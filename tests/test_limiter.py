@@ -0,0 +1,91 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from classes.limiter import AsyncLimiter, QueueFullError, retry_with_jitter
+
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request('POST', 'https://example.com/chat/completions'))
+
+
+def test_concurrency_never_exceeds_the_limit():
+    async def run():
+        limiter = AsyncLimiter('test', max_concurrent=2, max_queue=10)
+        running = []
+        peak = 0
+
+        async def request():
+            nonlocal peak
+            async with limiter:
+                running.append(1)
+                peak = max(peak, len(running))
+                await asyncio.sleep(0.01)
+                running.pop()
+
+        await asyncio.gather(*(request() for _ in range(8)))
+        return peak, limiter.stats()
+
+    peak, stats = asyncio.run(run())
+    assert peak == 2
+    assert stats['waiting'] == 0 and stats['rejected'] == 0
+
+
+def test_full_queue_rejects_at_once():
+    async def run():
+        limiter = AsyncLimiter('test', max_concurrent=1, max_queue=1)
+        release = asyncio.Event()
+
+        async def request():
+            async with limiter:
+                await release.wait()
+            return 'ok'
+
+        first = asyncio.create_task(request())
+        second = asyncio.create_task(request())
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            await request()
+        release.set()
+        return await first, await second, limiter.rejected
+
+    assert asyncio.run(run()) == ('ok', 'ok', 1)
+
+
+def test_retries_stop_after_the_last_attempt():
+    calls = []
+
+    async def request():
+        calls.append(1)
+        raise connection_error()
+
+    with pytest.raises(openai.APIConnectionError):
+        asyncio.run(retry_with_jitter(request, attempts=3, base_delay=0))
+    assert len(calls) == 3
+
+
+def test_retry_returns_after_a_transient_error():
+    calls = []
+
+    async def request():
+        calls.append(1)
+        if len(calls) == 1:
+            raise connection_error()
+        return 'ответ'
+
+    assert asyncio.run(retry_with_jitter(request, attempts=3, base_delay=0)) == 'ответ'
+    assert len(calls) == 2
+
+
+def test_non_retryable_errors_are_raised_at_once():
+    calls = []
+
+    async def request():
+        calls.append(1)
+        raise ValueError('bad request')
+
+    with pytest.raises(ValueError):
+        asyncio.run(retry_with_jitter(request, attempts=3, base_delay=0))
+    assert len(calls) == 1
@@ -0,0 +1,31 @@
+import asyncio
+from types import SimpleNamespace
+
+from telegram.error import BadRequest
+
+import test_main
+from classes.States import States
+
+
+class FakeBot:
+
+    async def delete_message(self, chat_id, message_id):
+        raise BadRequest('Message to delete not found')
+
+    async def edit_message_reply_markup(self, chat_id, message_id, reply_markup=None):
+        raise BadRequest('Message to edit not found')
+
+
+def test_main_menu_survives_failed_cleanup():
+    async def answer():
+        pass
+
+    async def reply_text(text, reply_markup=None, parse_mode=None):
+        return SimpleNamespace(message_id=30)
+
+    query = SimpleNamespace(answer=answer, message=SimpleNamespace(chat_id=1, reply_text=reply_text))
+    update = SimpleNamespace(callback_query=query, effective_chat=SimpleNamespace(id=1))
+    context = SimpleNamespace(bot=FakeBot(), user_data={'delete_message_id': 20, 'last_bot_message_id': 10})
+
+    assert asyncio.run(test_main.main_menu(update, context)) == States.MAIN_MENU_HANDLER
+    assert context.user_data == {'last_bot_message_id': 30}
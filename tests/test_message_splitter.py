@@ -0,0 +1,72 @@
+import asyncio
+
+from classes.message_splitter import split_message, split_point
+from classes.streaming_reply import StreamingReply
+
+
+def code_block(lines):
+    return '```python\n' + '\n'.join(f'x = {i}' for i in range(lines)) + '\n```'
+
+
+def test_short_text_is_one_message():
+    assert list(split_message('Короткий ответ.', 100)) == ['Короткий ответ.']
+    assert list(split_message('', 100)) == []
+
+
+def test_text_is_kept_and_parts_fit():
+    text = '\n\n'.join(['Первое предложение. Второе предложение! ' * 5, code_block(30), 'Итог `код` здесь. ' * 10])
+    parts = list(split_message(text, 200))
+    assert all(len(part) <= 200 for part in parts)
+    assert ''.join(text.split()) == ''.join(''.join(parts).split())
+    # в тексте ничего не добавлено: число ограждений блоков кода не изменилось
+    assert sum(part.count('```') for part in parts) == 2
+
+
+def test_paragraph_break_is_preferred():
+    text = 'а' * 60 + '.\n\n' + 'б' * 30 + '. ' + 'в' * 60
+    assert text[:split_point(text, 120)] == 'а' * 60 + '.\n\n'
+
+
+def test_cut_avoids_code_block_and_inline_code():
+    before = 'Текст перед блоком. ' * 3
+    text = before + code_block(3) + ' ' + 'после ' * 20
+    cut = split_point(text, len(before) + 20)
+    assert cut <= len(before)
+    text = 'Слово ' * 10 + '`очень длинный код с пробелами` ' + 'хвост ' * 10
+    cut = split_point(text, 80)
+    assert text[:cut].count('`') % 2 == 0
+
+
+def test_hard_cut_without_separators():
+    assert [len(part) for part in split_message('а' * 250, 100)] == [100, 100, 50]
+
+
+class FakeMessage:
+
+    def __init__(self, sent):
+        self.sent = sent
+        self.text = ''
+
+    async def reply_text(self, text, reply_markup=None, parse_mode=None):
+        message = FakeMessage(self.sent)
+        message.text = text
+        self.sent.append(message)
+        return message
+
+    async def edit_text(self, text, reply_markup=None, parse_mode=None):
+        self.text = text
+
+
+def test_streaming_splits_like_split_message():
+    text = '\n\n'.join(f'Абзац {i}. ' * 12 for i in range(10))
+    sent = []
+    reply = StreamingReply(FakeMessage(sent), edit_interval=0, max_length=300)
+
+    async def stream():
+        for end in range(0, len(text), 37):
+            await reply.update(text[:end])
+        await reply.finish(text)
+
+    asyncio.run(stream())
+    # сообщения отправлены экранированными, точка превращается в '\.'
+    assert [message.text.replace('\\', '') for message in sent] == list(split_message(text, 300))
@@ -0,0 +1,52 @@
+from classes.prompt_builder import CHUNK_SEPARATOR, PromptBuilder, TokenCounter, dedup_chunks
+
+
+USER = '{topic}\n{chat_history}\n{message_content}'
+
+
+class EstimatingCounter(TokenCounter):
+
+    # оценка по числу символов не зависит от того, скачана ли кодировка tiktoken
+    def _get_encoding(self):
+        return None
+
+
+def make_builder(budget):
+    return PromptBuilder(budget=budget, counter=EstimatingCounter())
+
+
+def test_duplicate_and_contained_chunks_are_dropped():
+    chunks = ['Монтаж  сплит-системы\nстоит 5000', 'Монтаж сплит-системы стоит 5000', 'сплит-системы', 'Гарантия год']
+    assert dedup_chunks(chunks) == ['Монтаж  сплит-системы\nстоит 5000', 'Гарантия год']
+    # более ранний фрагмент, целиком вошедший в следующий, заменяется им на своём месте
+    assert dedup_chunks(['стоит 5000', 'Гарантия год', 'Монтаж стоит 5000']) == ['Монтаж стоит 5000', 'Гарантия год']
+
+
+def test_over_budget_prompt_drops_oldest_history_then_last_chunks():
+    # системный промпт 10 токенов, шаблон с вопросом 11: свободно 200, истории достаётся 50
+    builder = make_builder(budget=221)
+    history = ['старый ' + 'x' * 53, 'средний ' + 'y' * 52, 'новый ' + 'z' * 54]
+    chunks = ['a' * 149, 'a' * 149, 'b' * 149, 'c' * 149]
+    messages, message_content, history_content, report = builder.build('S' * 30, USER, 'q' * 30, chunks, history)
+
+    # из истории остаются последние записи, которые помещаются в её долю (по 21 токену)
+    assert history_content == '\n'.join(history[1:])
+    # фрагменты идут по релевантности, повтор отброшен, третьему не хватило места
+    assert message_content == f'{CHUNK_SEPARATOR}\n{"a" * 149}\n{CHUNK_SEPARATOR}\n{"b" * 149}'
+    assert report['dropped_history'] == 1
+    assert report['dropped_chunks'] == 2
+    assert report['total'] <= report['budget']
+    assert messages[1]['content'] == USER.format(topic='q' * 30, chat_history=history_content,
+                                                 message_content=message_content)
+
+
+def test_last_chunk_is_cut_to_the_remaining_budget():
+    builder = make_builder(budget=221)
+    messages, message_content, history_content, report = builder.build(
+        'S' * 30, USER, 'q' * 30, ['a' * 149, 'b' * 400], [])
+
+    first, second = message_content.split(f'\n{CHUNK_SEPARATOR}\n')
+    assert first == f'{CHUNK_SEPARATOR}\n{"a" * 149}'
+    assert 0 < len(second) < 400
+    assert history_content == ''
+    assert report['total'] <= report['budget']
@@ -0,0 +1,45 @@
+import asyncio
+
+from telegram.error import BadRequest
+
+from classes.rate_limiter import TelegramRateLimiter
+
+
+def edit_request(limiter, sent, text, error=None):
+    async def callback(text):
+        sent.append(text)
+        if error is not None:
+            raise error
+        return text
+
+    data = {'chat_id': 1, 'message_id': 5, 'text': text}
+    return limiter.process_request(callback, (text,), {}, 'editMessageText', data, None)
+
+
+def test_queued_edits_are_merged():
+    async def run():
+        limiter = TelegramRateLimiter(private_rate=1, private_burst=1)
+        await limiter.initialize()
+        sent = []
+        # первая правка забирает токен чата, остальные ждут в очереди и объединяются
+        results = await asyncio.gather(*(edit_request(limiter, sent, f'v{i}') for i in range(4)))
+        return results, sent
+
+    results, sent = asyncio.run(run())
+    assert sent == ['v0', 'v3']
+    assert results == ['v0', 'v3', 'v3', 'v3']
+
+
+def test_merged_edits_get_the_error():
+    async def run():
+        limiter = TelegramRateLimiter(private_rate=1, private_burst=1)
+        await limiter.initialize()
+        sent = []
+        error = BadRequest('Message to edit not found')
+        await edit_request(limiter, sent, 'v0')
+        return await asyncio.gather(edit_request(limiter, sent, 'v1'), edit_request(limiter, sent, 'v2', error),
+                                    return_exceptions=True), sent
+
+    results, sent = asyncio.run(run())
+    assert sent == ['v0', 'v2']
+    assert all(isinstance(result, BadRequest) for result in results)
@@ -0,0 +1,84 @@
+import asyncio
+from types import SimpleNamespace
+
+import pandas as pd
+
+from classes.catalog import PriceCatalog
+from classes.keyboards import FULL_LIST_DATA, LETTER_PREFIX
+from classes.service_installation import ServiceInstallation
+from classes.States import States
+from config.answers_const_service import catalog_updated_text
+
+
+def make_catalog(manufacturer):
+    service = pd.DataFrame({
+        'Производитель': [manufacturer],
+        'Модель (category)': ['M-1'],
+        'Стоимость услуги 1': [1000],
+        'Стоимость услуги 2': [500],
+    })
+    installation = pd.DataFrame({
+        'Производитель': [manufacturer],
+        'Модель (category)': ['M-1'],
+        'Регион 1': [10000],
+    })
+    return PriceCatalog(service, installation)
+
+
+class FakeQuery:
+
+    def __init__(self, data):
+        self.data = data
+        self.message = SimpleNamespace(message_id=7)
+        self.texts = []
+
+    async def answer(self):
+        pass
+
+    async def edit_message_text(self, text, reply_markup=None, parse_mode=None):
+        self.texts.append(text)
+        return self.message
+
+
+class FakeMessage:
+
+    def __init__(self, text):
+        self.text = text
+        self.texts = []
+
+    async def reply_text(self, text, reply_markup=None, parse_mode=None):
+        self.texts.append(text)
+        return SimpleNamespace(message_id=8)
+
+
+def make_context(menu):
+    return SimpleNamespace(user_data={'service_type': 'service', 'menu': menu, 'menu_filter': None}, bot=None)
+
+
+def test_navigation_in_a_menu_gone_from_the_catalog_is_stale():
+    service_bot = ServiceInstallation(make_catalog('Бета'))
+    for data in (f'{LETTER_PREFIX}М', FULL_LIST_DATA, 'page:1'):
+        query = FakeQuery(data)
+        context = make_context(('service', 'Альфа'))
+        state = asyncio.run(service_bot.handle_menu_navigation(SimpleNamespace(callback_query=query), context))
+        assert state == States.SERVICE_TYPE
+        assert query.texts == [catalog_updated_text]
+        assert 'menu' not in context.user_data
+
+
+def test_search_in_a_menu_gone_from_the_catalog_is_stale():
+    service_bot = ServiceInstallation(make_catalog('Бета'))
+    message = FakeMessage('M')
+    context = make_context(('service', 'Альфа'))
+    update = SimpleNamespace(callback_query=None, message=message, effective_chat=SimpleNamespace(id=1))
+    assert asyncio.run(service_bot.search_menu(update, context)) == States.SERVICE_TYPE
+    assert message.texts == [catalog_updated_text]
+    assert context.user_data['last_bot_message_id'] == 8
+
+
+def test_navigation_in_an_existing_menu_stays_in_it():
+    service_bot = ServiceInstallation(make_catalog('Альфа'))
+    query = FakeQuery(FULL_LIST_DATA)
+    state = asyncio.run(service_bot.handle_menu_navigation(SimpleNamespace(callback_query=query), make_context(('service', 'Альфа'))))
+    assert state == States.MODEL
+    assert query.texts != [catalog_updated_text]
@@ -0,0 +1,35 @@
+import asyncio
+
+from classes.sqlite_persistence import SQLitePersistence
+
+
+def test_workers_see_each_others_data(tmp_path):
+    path = str(tmp_path / 'persistence.sqlite')
+
+    async def run():
+        first = SQLitePersistence(path)
+        second = SQLitePersistence(path)
+        assert await second.get_user_data() == {}
+
+        await first.update_user_data(1, {'chat_history': ['вопрос']})
+        await first.update_chat_data(10, {'mode': 'service'})
+        user_data, chat_data = {}, {}
+        await second.refresh_user_data(1, user_data)
+        await second.refresh_chat_data(10, chat_data)
+        assert user_data == {'chat_history': ['вопрос']}
+        assert chat_data == {'mode': 'service'}
+
+        # свои же изменения и неизменённые данные повторно не перечитываются
+        user_data['local'] = True
+        await second.refresh_user_data(1, user_data)
+        assert user_data['local'] is True
+
+        await second.update_user_data(1, {'chat_history': ['вопрос', 'ответ']})
+        first_view = {}
+        await first.refresh_user_data(1, first_view)
+        assert first_view == {'chat_history': ['вопрос', 'ответ']}
+
+        await first.flush()
+        await second.flush()
+
+    asyncio.run(run())
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+
+from classes import textbot
+from classes.lexical_search import BM25Index
+from classes.limiter import AsyncLimiter
+
+
+class FakeEmbeddings:
+
+    def __init__(self, embedded):
+        self.embedded = embedded
+
+    async def aembed_query(self, text):
+        # BM25 ищет в потоке и ждёт этого события: без одновременного запуска оно не наступит
+        self.embedded.set()
+        return [1.0]
+
+
+class FakeStore:
+
+    def __init__(self, documents, embeddings=None):
+        self.docstore = InMemoryDocstore({str(i): document for i, document in enumerate(documents)})
+        self.index_to_docstore_id = {i: str(i) for i in range(len(documents))}
+        self.embeddings = embeddings
+
+    def similarity_search_by_vector(self, embedding, k):
+        return [self.docstore.search('1')]
+
+
+class WaitingIndex(BM25Index):
+
+    def __init__(self, documents, embedded):
+        super().__init__(documents)
+        self.embedded = embedded
+
+    def search(self, query, k):
+        return super().search(query, k) if self.embedded.wait(5) else []
+
+
+def test_hybrid_search_runs_bm25_and_embedding_together(monkeypatch):
+    monkeypatch.setattr(textbot, 'RETRIEVAL_MODE', 'hybrid')
+    embedded = threading.Event()
+    documents = [Document(page_content='Кондиционер AB-123'), Document(page_content='Монтаж сплит-системы')]
+    db = FakeStore(documents, FakeEmbeddings(embedded))
+    textbot._lexical_indexes[db] = WaitingIndex(documents, embedded)
+
+    embedding, docs = asyncio.run(textbot.retrieve(db, 'AB-123', 2))
+    assert embedding == [1.0]
+    # оба поиска дали по фрагменту
+    assert sorted(doc.page_content for doc in docs) == ['Кондиционер AB-123', 'Монтаж сплит-системы']
+
+
+def test_vectorstore_is_published_with_its_bm25_index(monkeypatch):
+    loads = []
+
+    def load(path, embeddings, index_name, nprobe):
+        loads.append(path)
+        return FakeStore([Document(page_content='Кондиционер AB-123')])
+
+    monkeypatch.setattr(textbot, 'load_knowledge_base', load)
+    monkeypatch.setattr(textbot, 'get_embeddings', lambda: None)
+    monkeypatch.setattr(textbot, '_db_main', None)
+    monkeypatch.setattr(textbot, '_db_loaded_version', None)
+    monkeypatch.setattr(textbot, '_db_checked_at', 0.0)
+    monkeypatch.setattr(textbot, '_db_lock', asyncio.Lock())
+
+    async def run():
+        return await asyncio.gather(*(textbot.get_db() for _ in range(3)))
+
+    dbs = asyncio.run(run())
+    assert len(loads) == 1 and dbs[0] is dbs[1] is dbs[2]
+    assert textbot.get_lexical_index(dbs[0]).search('AB-123', 1)[0].page_content == 'Кондиционер AB-123'
+
+
+class FakeStream:
+
+    def __init__(self, deltas):
+        self.deltas = deltas
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for delta in self.deltas:
+            await asyncio.sleep(0)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+
+
+def test_streamed_edits_do_not_hold_the_llm_slot(monkeypatch):
+    limiter = AsyncLimiter('llm', max_concurrent=1, max_queue=1)
+    monkeypatch.setattr(textbot, 'llm_limiter', limiter)
+
+    async def create(**kwargs):
+        return FakeStream(['Мон', 'таж ', 'стоит ', '5000'])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(textbot, 'get_client', lambda: client)
+
+    async def retrieve(db, topic, num_chunks):
+        return None, []
+
+    monkeypatch.setattr(textbot, 'retrieve', retrieve)
+    shown = []
+
+    async def on_delta(text):
+        # медленная правка: генерация не ждёт её, а место в лимитере освобождается до её конца
+        shown.append(text)
+        while limiter._semaphore.locked():
+            await asyncio.sleep(0.01)
+
+    async def run():
+        return await asyncio.wait_for(
+            textbot.company_answer('system', '{topic}', 'Сколько стоит монтаж?', None, [], 5, 'model', 0.1, on_delta), 5)
+
+    assert asyncio.run(run()) == 'Монтаж стоит 5000'
+    assert shown == ['Мон']
@@ -0,0 +1,114 @@
+import asyncio
+import socket
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from telegram.ext import Application
+
+from classes.sharding import ShardRouter
+from classes.webhook import HEALTH_PATH, SECRET_HEADER, create_web_app, run_webhook
+
+
+SECRET = 's3cret'
+
+
+def make_update(update_id, chat_id):
+    chat = {'id': chat_id, 'type': 'private', 'first_name': 'Test'}
+    return {
+        'update_id': update_id,
+        'message': {'message_id': 1, 'date': 0, 'chat': chat, 'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Test'},
+                    'text': 'Привет'},
+    }
+
+
+def make_application():
+    return Application.builder().token('1:fake').updater(None).build()
+
+
+def test_secret_token_is_required():
+    async def run():
+        application = make_application()
+        async with TestClient(TestServer(create_web_app(application, SECRET))) as client:
+            missing = await client.post('/telegram', json=make_update(1, 10))
+            wrong = await client.post('/telegram', json=make_update(2, 10), headers={SECRET_HEADER: 'wrong'})
+            right = await client.post('/telegram', json=make_update(3, 10), headers={SECRET_HEADER: SECRET})
+            return missing.status, wrong.status, right.status, application.update_queue.qsize()
+
+    assert asyncio.run(run()) == (403, 403, 200, 1)
+
+
+def test_health_reports_whether_application_runs():
+    async def run():
+        application = make_application()
+        async with TestClient(TestServer(create_web_app(application, SECRET))) as client:
+            response = await client.get(HEALTH_PATH)
+            return response.status, await response.json()
+
+    status, body = asyncio.run(run())
+    assert status == 503
+    assert body == {'running': False, 'pending_updates': 0, 'worker': 0}
+
+
+def test_update_is_forwarded_to_owning_shard():
+    async def run():
+        owner_application = make_application()
+        owner_app = create_web_app(owner_application, SECRET)
+        async with TestClient(TestServer(owner_app)) as owner:
+            owner_url = str(owner.make_url('/telegram'))
+            router = ShardRouter(0, ['http://127.0.0.1:1/telegram', owner_url])
+            application = make_application()
+            async with TestClient(TestServer(create_web_app(application, SECRET, router=router))) as client:
+                # чат 11 принадлежит воркеру 1, чат 10 - воркеру 0
+                forwarded = await client.post('/telegram', json=make_update(1, 11), headers={SECRET_HEADER: SECRET})
+                local = await client.post('/telegram', json=make_update(2, 10), headers={SECRET_HEADER: SECRET})
+            update = await owner_application.update_queue.get()
+            return forwarded.status, local.status, update.effective_chat.id, application.update_queue.qsize()
+
+    assert asyncio.run(run()) == (200, 200, 11, 1)
+
+
+def test_unreachable_shard_answers_502():
+    async def run():
+        router = ShardRouter(0, ['http://127.0.0.1:1/telegram', 'http://127.0.0.1:1/telegram'])
+        async with TestClient(TestServer(create_web_app(make_application(), SECRET, router=router))) as client:
+            response = await client.post('/telegram', json=make_update(1, 11), headers={SECRET_HEADER: SECRET})
+            return response.status
+
+    assert asyncio.run(run()) == 502
+
+
+class RecordingApplication:
+
+    def __init__(self):
+        self.calls = []
+        self.running = False
+        self.post_init = None
+        self.post_shutdown = None
+
+    async def __aenter__(self):
+        self.calls.append('initialize')
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.calls.append('shutdown')
+
+    async def start(self):
+        self.calls.append('start')
+        self.running = True
+
+    async def stop(self):
+        self.calls.append('stop')
+        self.running = False
+
+
+def test_application_is_stopped_when_the_server_fails_to_start():
+    async def run():
+        application = RecordingApplication()
+        with socket.socket() as busy:
+            busy.bind(('127.0.0.1', 0))
+            busy.listen()
+            with pytest.raises(OSError):
+                await run_webhook(application, SECRET, listen='127.0.0.1', port=busy.getsockname()[1])
+        return application.calls
+
+    assert asyncio.run(run()) == ['initialize', 'start', 'stop', 'shutdown']
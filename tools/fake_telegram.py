@@ -0,0 +1,144 @@
+import argparse
+import asyncio
+import itertools
+import json
+import time
+
+import aiohttp
+from aiohttp import web
+
+from classes.webhook import SECRET_HEADER
+
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+TEST_USER = {'id': 100, 'is_bot': False, 'first_name': 'Test'}
+
+
+class FakeTelegram:
+
+    def __init__(self, webhook_url: str, secret_token: str, user: dict = None):
+        """
+        Initializes the FakeTelegram object.
+
+        A local stand-in for the Telegram Bot API to try the webhook mode without Telegram: it
+        answers the bot's API calls (run the bot with TELEGRAM_API_URL pointing here), prints
+        them, and sends the user's messages and button presses to the bot's webhook.
+
+        Args:
+            webhook_url (str): The full URL of the bot's webhook.
+            secret_token (str): The bot's webhook secret token.
+            user (dict): The Telegram user who writes to the bot.
+        """
+        self.webhook_url = webhook_url
+        self.secret_token = secret_token
+        self.user = user or TEST_USER
+        self.chat = {'id': self.user['id'], 'type': 'private', 'first_name': self.user['first_name']}
+        self._ids = itertools.count(1)
+        # сообщения чата по message_id, как их видит пользователь
+        self.messages = {}
+
+    def _message(self, text: str, sender: dict, reply_markup=None):
+        """
+        Creates a message in the chat.
+
+        Args:
+            text (str): The message text.
+            sender (dict): BOT_USER or the user.
+            reply_markup (dict): The inline keyboard, if any.
+
+        Returns:
+            dict: The message as the Bot API returns it.
+        """
+        message = {'message_id': next(self._ids), 'date': int(time.time()), 'chat': self.chat, 'from': sender, 'text': text}
+        if reply_markup:
+            message['reply_markup'] = reply_markup
+        self.messages[message['message_id']] = message
+        return message
+
+    async def handle_method(self, request: web.Request):
+        """
+        Answers a Bot API call of the bot.
+
+        Returns:
+            web.Response: The Bot API response with a plausible result.
+        """
+        method = request.match_info['method']
+        params = dict(await request.post())
+        if not params and request.can_read_body:
+            params = await request.json()
+        reply_markup = json.loads(params['reply_markup']) if params.get('reply_markup') else None
+        result = True
+        if method == 'getMe':
+            result = BOT_USER
+        elif method == 'sendMessage':
+            result = self._message(params['text'], BOT_USER, reply_markup)
+        elif method in ('editMessageText', 'editMessageReplyMarkup'):
+            message = self.messages.get(int(params.get('message_id', 0)))
+            if message is not None:
+                if 'text' in params:
+                    message['text'] = params['text']
+                message.pop('reply_markup', None)
+                if reply_markup:
+                    message['reply_markup'] = reply_markup
+                result = message
+        elif method == 'deleteMessage':
+            self.messages.pop(int(params.get('message_id', 0)), None)
+        if method not in ('getMe', 'sendChatAction'):
+            print(f'<< {method}: {params.get("text", params.get("message_id", ""))}')
+            if reply_markup:
+                buttons = [button.get('callback_data') for row in reply_markup.get('inline_keyboard', []) for button in row]
+                print(f'   кнопки: {buttons}')
+        return web.json_response({'ok': True, 'result': result})
+
+    async def send_update(self, session: aiohttp.ClientSession, line: str):
+        """
+        Sends the user's input to the bot's webhook.
+
+        Args:
+            session (aiohttp.ClientSession): The HTTP session.
+            line (str): A message text, or '!<callback_data>' to press a button of the last bot
+                message that has one.
+
+        Returns:
+            int: The HTTP status of the webhook.
+        """
+        update = {'update_id': next(self._ids)}
+        if line.startswith('!'):
+            message = next((message for message in reversed(self.messages.values())
+                            if message['from'] is BOT_USER and 'reply_markup' in message), None)
+            update['callback_query'] = {'id': str(update['update_id']), 'from': self.user, 'chat_instance': 'fake',
+                                        'data': line[1:], 'message': message}
+        else:
+            message = self._message(line, self.user)
+            if line.startswith('/'):
+                message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(line.split()[0])}]
+            update['message'] = message
+        async with session.post(self.webhook_url, json=update, headers={SECRET_HEADER: self.secret_token}) as response:
+            return response.status
+
+
+async def main(args):
+    fake = FakeTelegram(args.webhook, args.secret)
+    web_app = web.Application()
+    web_app.router.add_post('/bot{token}/{method}', fake.handle_method)
+    runner = web.AppRunner(web_app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', args.port).start()
+    print(f'Bot API: TELEGRAM_API_URL=http://127.0.0.1:{args.port}/bot')
+    print('Введите сообщение, или !данные_кнопки для нажатия кнопки; пустая строка - выход')
+    try:
+        async with aiohttp.ClientSession() as session:
+            while line := (await asyncio.to_thread(input, '>> ')).strip():
+                status = await fake.send_update(session, line)
+                if status != 200:
+                    print(f'webhook ответил {status}')
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Локальная замена Telegram для проверки бота в режиме webhook.')
+    parser.add_argument('--webhook', default='http://127.0.0.1:8080/telegram', help='адрес webhook бота')
+    parser.add_argument('--secret', required=True, help='WEBHOOK_SECRET бота')
+    parser.add_argument('--port', type=int, default=8081, help='порт поддельного Bot API')
+    asyncio.run(main(parser.parse_args()))